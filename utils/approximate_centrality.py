@@ -0,0 +1,335 @@
+"""
+Approximations of betweenness and closeness centralities by pivot sampling.
+
+Exact measures (used by `nd.seeding.BetweennessSelector` and
+`nd.seeding.ClosenessSelector`) need a BFS from every node, i.e. O(nm) time. Here
+BFS passes are run only from k pivots drawn uniformly without replacement, and
+values are extrapolated to the whole graph:
+
+* betweenness as in Brandes & Pich (2007), "Centrality estimation in large
+  networks": dependencies of nodes accumulated over pivots are scaled by n / k,
+* closeness as in Eppstein & Wang (2004), "Fast approximation of centrality":
+  the mean distance to a node is estimated from pivots which reach it.
+
+For k equal to the number of nodes both measures are exact and match values of
+`nx.betweenness_centrality` and `nx.closeness_centrality`. Each BFS pass is
+level-synchronous on a CSR adjacency matrix, and passes can be spread over a
+pool of processes.
+"""
+import os
+import time
+
+from abc import abstractmethod
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import networkx as nx
+import network_diffusion as nd
+import numpy as np
+import pandas as pd
+
+from utils import functions
+
+
+_WORKER: Dict[str, Any] = {}
+
+
+def _get_neighbours(
+    indptr: np.ndarray, indices: np.ndarray, frontier: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Return arrays with tails and heads of all edges leaving the frontier."""
+    starts = indptr[frontier]
+    counts = indptr[frontier + 1] - starts
+    offsets = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+    return np.repeat(frontier, counts), indices[offsets]
+
+
+def _pivot_pass(indptr: np.ndarray, indices: np.ndarray, pivot: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Run a BFS from the pivot and accumulate dependencies of nodes on it.
+
+    :param indptr: index pointers of the CSR adjacency matrix
+    :param indices: column indices of the CSR adjacency matrix
+    :param pivot: a row of the pivot in the matrix
+    :return: dependencies of nodes (as in the algorithm of Brandes) and their
+        distances from the pivot (-1 for unreachable nodes)
+    """
+    n = len(indptr) - 1
+    distance = np.full(n, -1, dtype=np.int64)
+    distance[pivot] = 0
+    sigma = np.zeros(n)
+    sigma[pivot] = 1
+
+    # edges of the DAG of shortest paths, level by level
+    levels: List[Tuple[np.ndarray, np.ndarray]] = []
+    frontier = np.array([pivot])
+    while frontier.size:
+        tails, heads = _get_neighbours(indptr, indices, frontier)
+        distance[heads[distance[heads] == -1]] = len(levels) + 1
+        on_dag = distance[heads] == len(levels) + 1
+        tails, heads = tails[on_dag], heads[on_dag]
+        np.add.at(sigma, heads, sigma[tails])
+        levels.append((tails, heads))
+        frontier = np.unique(heads)
+
+    delta = np.zeros(n)
+    for tails, heads in reversed(levels):
+        np.add.at(delta, tails, sigma[tails] / sigma[heads] * (1 + delta[heads]))
+    delta[pivot] = 0
+    return delta, distance
+
+
+def _init_worker(indptr: np.ndarray, indices: np.ndarray) -> None:
+    _WORKER.update(indptr=indptr, indices=indices)
+
+
+def _run_pivots(pivots: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    indptr, indices = _WORKER["indptr"], _WORKER["indices"]
+    n = len(indptr) - 1
+    dependency, distance_sum, reached = np.zeros(n), np.zeros(n), np.zeros(n)
+    for pivot in pivots:
+        delta, distance = _pivot_pass(indptr, indices, pivot)
+        dependency += delta
+        distance_sum += np.maximum(distance, 0)
+        reached += distance > 0
+    return dependency, distance_sum, reached
+
+
+def get_pivots(n: int, k: int, seed: Optional[Union[int, np.random.Generator]] = None) -> np.ndarray:
+    """
+    Draw pivots uniformly without replacement.
+
+    :param n: number of nodes
+    :param k: number of pivots, if it is not less than `n` all nodes are used
+    :param seed: a seed or a generator, see `functions.get_rng`
+    :return: a sorted array of rows of pivots
+    """
+    if k >= n:
+        return np.arange(n)
+    return np.sort(functions.get_rng(seed).choice(n, size=k, replace=False))
+
+
+def approximate_centralities(
+    graph: nx.Graph,
+    k: int = 256,
+    seed: Optional[Union[int, np.random.Generator]] = None,
+    n_jobs: Optional[int] = 1,
+) -> Tuple[Dict[Any, float], Dict[Any, float]]:
+    """
+    Estimate betweenness and closeness centralities of nodes of the graph.
+
+    Both measures are obtained from the same BFS passes. Edges are unweighted
+    and the direction of edges of directed graphs is respected, i.e. values
+    correspond to defaults of `nx.betweenness_centrality` (normalised) and
+    `nx.closeness_centrality` (inward distances, `wf_improved=True`).
+
+    :param graph: a graph to compute centralities for
+    :param k: number of pivots
+    :param seed: a seed or a generator to draw pivots with, see
+        `functions.get_rng`
+    :param n_jobs: number of processes to run BFS passes in; if None all CPUs
+        are used, if 1 passes are run in the current process
+    :return: dicts keyed by nodes with values of betweenness and closeness
+    """
+    nodes = [*graph.nodes()]
+    n = len(nodes)
+    if n == 0:
+        return {}, {}
+    adjacency = nx.to_scipy_sparse_array(graph, nodelist=nodes, weight=None, format="csr")
+    indptr, indices = adjacency.indptr.astype(np.int64), adjacency.indices.astype(np.int64)
+    pivots = get_pivots(n, k, seed)
+
+    n_jobs = n_jobs or os.cpu_count() or 1
+    if n_jobs == 1:
+        _init_worker(indptr, indices)
+        dependency, distance_sum, reached = _run_pivots(pivots)
+    else:
+        chunks = np.array_split(pivots, min(n_jobs, len(pivots)))
+        with ProcessPoolExecutor(n_jobs, initializer=_init_worker, initargs=(indptr, indices)) as executor:
+            partials = [*executor.map(_run_pivots, chunks)]
+        dependency, distance_sum, reached = (sum(values) for values in zip(*partials))
+
+    # betweenness extrapolated to all sources and normalised as in networkx
+    scale = n / len(pivots) / ((n - 1) * (n - 2)) if n > 2 else 0
+    betweenness = dependency * scale
+
+    # closeness from pivots which reach the node (a node is not its own pivot):
+    # a share of reaching pivots estimates a share of nodes the node is
+    # reachable from and the mean of their distances the mean distance to it
+    is_pivot = np.zeros(n, dtype=bool)
+    is_pivot[pivots] = True
+    n_sources = len(pivots) - is_pivot
+    closeness = np.divide(
+        reached ** 2,
+        n_sources * distance_sum,
+        out=np.zeros(n),
+        where=(distance_sum > 0) & (n_sources > 0),
+    )
+    return dict(zip(nodes, betweenness.tolist())), dict(zip(nodes, closeness.tolist()))
+
+
+def approximate_betweenness(
+    graph: nx.Graph,
+    k: int = 256,
+    seed: Optional[Union[int, np.random.Generator]] = None,
+    n_jobs: Optional[int] = 1,
+) -> Dict[Any, float]:
+    """Estimate betweenness centrality of nodes, see `approximate_centralities`."""
+    return approximate_centralities(graph, k, seed, n_jobs)[0]
+
+
+def approximate_closeness(
+    graph: nx.Graph,
+    k: int = 256,
+    seed: Optional[Union[int, np.random.Generator]] = None,
+    n_jobs: Optional[int] = 1,
+) -> Dict[Any, float]:
+    """Estimate closeness centrality of nodes, see `approximate_centralities`."""
+    return approximate_centralities(graph, k, seed, n_jobs)[1]
+
+
+class _ApproximateCentralitySelector(nd.seeding.base_selector.BaseSeedSelector):
+    """Base class of seed selectors based on approximate centralities."""
+
+    def __init__(
+        self, k: int = 256, seed: Optional[int] = None, n_jobs: Optional[int] = 1, **kwargs: Any
+    ) -> None:
+        """
+        Initialise the selector.
+
+        :param k: number of pivots drawn in each layer
+        :param seed: a seed to draw pivots with; if not provided it is drawn
+            from the global NumPy state, so that rankings are determined by
+            `functions.set_seed`
+        :param n_jobs: number of processes to run BFS passes in, see
+            `approximate_centralities`
+        """
+        super().__init__(**kwargs)
+        self.k = k
+        self.seed = seed
+        self.n_jobs = n_jobs
+
+    @abstractmethod
+    def _get_scores(self, graph: nx.Graph, rng: np.random.Generator) -> Dict[Any, float]:
+        """Compute approximate scores of nodes of the layer with pivots drawn from the generator."""
+        ...
+
+    def _calculate_ranking_list(self, graph: nx.Graph) -> List[Any]:
+        """
+        Create a ranking of nodes.
+
+        :param graph: single layer graph to compute ranking for
+        :return: list of node-ids ordered descending by their ranking position
+        """
+        scores = self._get_scores(graph, functions.get_rng(self.seed))
+        return sorted(scores, key=lambda x: scores[x], reverse=True)
+
+    def actorwise(self, net: nd.MultilayerNetwork) -> List[nd.MLNetworkActor]:
+        """
+        Compute ranking for actors.
+
+        As in exact selectors of Network Diffusion, the score of an actor is a
+        mean of its scores in layers it belongs to.
+        """
+        rng = functions.get_rng(self.seed)
+        l_scores = {l_name: self._get_scores(l_graph, rng) for l_name, l_graph in net.layers.items()}
+        actor_scores = {
+            actor: np.mean([l_scores[l_name][actor.actor_id] for l_name in actor.layers])
+            for actor in net.get_actors()
+        }
+        return sorted(actor_scores, key=lambda x: actor_scores[x], reverse=True)
+
+
+class ApproximateBetweennessSelector(_ApproximateCentralitySelector):
+    """Seed selector based on betweenness centrality estimated from pivots."""
+
+    def _get_scores(self, graph: nx.Graph, rng: np.random.Generator) -> Dict[Any, float]:
+        return approximate_betweenness(graph, self.k, rng, self.n_jobs)
+
+    def __str__(self) -> str:
+        """Return seed method's description."""
+        return f"Approximate betweenness centrality-based seed selection method (k={self.k})."
+
+
+class ApproximateClosenessSelector(_ApproximateCentralitySelector):
+    """Seed selector based on closeness centrality estimated from pivots."""
+
+    def _get_scores(self, graph: nx.Graph, rng: np.random.Generator) -> Dict[Any, float]:
+        return approximate_closeness(graph, self.k, rng, self.n_jobs)
+
+    def __str__(self) -> str:
+        """Return seed method's description."""
+        return f"Approximate closeness centrality-based seed selection method (k={self.k})."
+
+
+def ranking_overlap(ranking: List[Any], reference: List[Any], top: int) -> float:
+    """
+    Compute a share of common items in heads of two rankings.
+
+    :param ranking: a ranking to evaluate
+    :param reference: a reference (e.g. exact) ranking
+    :param top: length of heads of rankings to compare
+    :return: a value between 0 and 1
+    """
+    return len({*ranking[:top]}.intersection(reference[:top])) / top
+
+
+def compare_with_exact(
+    net: nd.MultilayerNetwork,
+    k_values: List[int],
+    top_shares: Tuple[float, ...] = (0.05, 0.1, 0.25),
+    seed: Optional[int] = None,
+    n_jobs: Optional[int] = 1,
+) -> pd.DataFrame:
+    """
+    Compare actorwise rankings of approximate selectors with exact ones.
+
+    :param net: a network to compute rankings for
+    :param k_values: numbers of pivots to evaluate
+    :param top_shares: lengths of heads of rankings to compare, as shares of
+        the number of actors
+    :param seed: a seed of approximate selectors
+    :param n_jobs: number of processes of approximate selectors
+    :return: a dataframe with overlaps of rankings and their computation times
+    """
+    pairs = {
+        "betweenness": (nd.seeding.BetweennessSelector(), ApproximateBetweennessSelector),
+        "closeness": (nd.seeding.ClosenessSelector(), ApproximateClosenessSelector),
+    }
+    n_actors = net.get_actors_num()
+    records = []
+    for measure, (exact_selector, approximate_class) in pairs.items():
+        start = time.perf_counter()
+        reference = exact_selector.actorwise(net)
+        exact_time = time.perf_counter() - start
+        for k in k_values:
+            start = time.perf_counter()
+            ranking = approximate_class(k=k, seed=seed, n_jobs=n_jobs).actorwise(net)
+            records.append({
+                "measure": measure,
+                "k": k,
+                "exact_s": exact_time,
+                "approximate_s": time.perf_counter() - start,
+                **{
+                    f"overlap_top_{share:.0%}": ranking_overlap(ranking, reference, max(1, round(share * n_actors)))
+                    for share in top_shares
+                },
+            })
+    return pd.DataFrame(records)
+
+
+if __name__ == "__main__":
+    """Check exactness for k = n and report overlaps with exact rankings."""
+    from utils import networks
+
+    for graph in (nx.karate_club_graph(), nx.gnp_random_graph(200, 0.03, seed=1, directed=True)):
+        betweenness, closeness = approximate_centralities(graph, k=len(graph))
+        reference_b, reference_c = nx.betweenness_centrality(graph), nx.closeness_centrality(graph)
+        assert all(np.isclose(betweenness[node], reference_b[node]) for node in graph.nodes())
+        assert all(np.isclose(closeness[node], reference_c[node]) for node in graph.nodes())
+    for serial, parallel in zip(approximate_centralities(graph, 50, 7), approximate_centralities(graph, 50, 7, 2)):
+        assert all(np.isclose(serial[node], parallel[node]) for node in graph.nodes())
+
+    for name, net in (("AUCS", networks.get_aucs_network()), ("Lazega", networks.get_lazega_network())):
+        print(name)
+        print(compare_with_exact(net, k_values=[8, 16, 32, 64], seed=42).round(3).to_string(index=False))
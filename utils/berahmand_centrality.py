@@ -7,10 +7,13 @@ coefficient for identifying influential spreaders in complex networks" in "
 Chaos, Solitons & Fractals",  Volume 110, 2018, Pages 41-54, ISSN 0960-0779,
 DOI: https://doi.org/10.1016/j.chaos.2018.03.014.
 """
-from typing import Any, Dict, List
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Set, Tuple
 
 import networkx as nx
 import network_diffusion as nd
+import numpy as np
+import scipy.sparse as sp
 
 
 def berahmand_centrality(graph: nx.Graph) -> Dict[int, float]:
@@ -37,12 +40,217 @@ def berahmand_centrality(graph: nx.Graph) -> Dict[int, float]:
         cc_i = CC[i]
         neigh_1st_i = {*nx.neighbors(graph, i)}
         neigh_2nd_i = set().union(*[{*nx.neighbors(graph, n)} for n in neigh_1st_i]).difference({i})
-        centrality_i = k_i * 1 / (cc_i + 1 / k_i) + sum([CC[n] for n in neigh_2nd_i])
+        centrality_i = k_i * 1 / (cc_i + 1 / k_i) if k_i > 0 else 0
+        centrality_i += sum([CC[n] for n in neigh_2nd_i])
         ci_dict[i] = centrality_i
 
     return ci_dict
 
 
+def _berahmand_components(adjacency: sp.spmatrix) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Compute components of Berahmand centrailty of nodes of an undirected graph.
+
+    All measures are obtained from sparse matrices: the degree is a row sum of
+    A, a number of triangles is a row sum of (A @ A) * A (a diagonal of A^3
+    without materialising it) and second-order neighbours are nonzero entries
+    of A @ A except the diagonal. Nodes with degree 0 get a centrality 0.
+
+    :param adjacency: a symmetric adjacency matrix of the graph
+    :return: arrays with degrees, clustering coefficients and sums of
+        clustering coefficients of second-order neighbours ordered as rows of
+        the matrix
+    """
+    adj = sp.csr_matrix(adjacency, dtype=np.float64)
+    adj.data[:] = 1
+    self_loops = adj.diagonal()
+
+    # degree as in nx.degree, i.e. self-loops are counted twice
+    degree = np.asarray(adj.sum(axis=1)).ravel() + self_loops
+
+    # clustering coefficient as in nx.clustering, i.e. without self-loops
+    adj_2 = adj @ adj
+    if self_loops.any():
+        adj_nl = adj - sp.diags(self_loops)
+        adj_nl.eliminate_zeros()
+        adj_nl_2 = adj_nl @ adj_nl
+    else:
+        adj_nl, adj_nl_2 = adj, adj_2
+    triangles = np.asarray(adj_nl_2.multiply(adj_nl).sum(axis=1)).ravel()
+    degree_nl = np.asarray(adj_nl.sum(axis=1)).ravel()
+    possible = degree_nl * (degree_nl - 1)
+    clustering = np.divide(triangles, possible, out=np.zeros_like(triangles), where=possible > 0)
+
+    # sum of clustering coefficients of second-order neighbours, a node is
+    # its own second-order neighbour if it has at least one neighbour
+    reach_2nd = adj_2.copy()
+    reach_2nd.data[:] = 1
+    cc_2nd = reach_2nd @ clustering - (reach_2nd.diagonal() > 0) * clustering
+    return degree, clustering, cc_2nd
+
+
+def berahmand_centrality_from_adjacency(adjacency: sp.spmatrix) -> np.ndarray:
+    """
+    Compute Berahmand centrailty of nodes of an undirected graph.
+
+    :param adjacency: a symmetric adjacency matrix of the graph
+    :return: an array with centrality values ordered as rows of the matrix
+    """
+    degree, clustering, cc_2nd = _berahmand_components(adjacency)
+    centrality = np.divide(
+        degree, clustering + 1 / np.where(degree > 0, degree, 1), out=np.zeros_like(degree), where=degree > 0
+    )
+    return centrality + cc_2nd
+
+
+def berahmand_centrality_sparse(graph: nx.Graph) -> Dict[int, float]:
+    """
+    Vectorised implementation of Berahmand centrailty.
+
+    It returns the same values as `berahmand_centrality` but scales to large
+    graphs and handles isolated nodes.
+
+    :param graph: an undirected graph to compute centrality measures for
+    :return: a dict keyed by node ids with values standing for corresponding
+        centrality value
+    """
+    if graph.is_directed():
+        raise ValueError("Graph must be undirected!")
+    nodes = [*graph.nodes()]
+    adjacency = nx.to_scipy_sparse_array(graph, nodelist=nodes, weight=None, format="csr")
+    return dict(zip(nodes, berahmand_centrality_from_adjacency(adjacency).tolist()))
+
+
+def _neighbours_2nd(graph: nx.Graph, node: Any) -> Set[Any]:
+    return set().union(*[{*nx.neighbors(graph, n)} for n in nx.neighbors(graph, node)]).difference({node})
+
+
+@dataclass
+class BerahmandState:
+    """Berahmand centrailty of nodes together with its components."""
+
+    degree: Dict[Any, int]
+    clustering: Dict[Any, float]
+    cc_2nd: Dict[Any, float]
+    centrality: Dict[Any, float]
+
+    @staticmethod
+    def _centrality(k_i: int, cc_i: float, cc_2nd_i: float) -> float:
+        return (k_i * 1 / (cc_i + 1 / k_i) if k_i > 0 else 0) + cc_2nd_i
+
+    @classmethod
+    def from_graph(cls, graph: nx.Graph) -> "BerahmandState":
+        """Compute the state from scratch for an undirected graph."""
+        if graph.is_directed():
+            raise ValueError("Graph must be undirected!")
+        nodes = [*graph.nodes()]
+        adjacency = nx.to_scipy_sparse_array(graph, nodelist=nodes, weight=None, format="csr")
+        degree, clustering, cc_2nd = _berahmand_components(adjacency)
+        state = cls(
+            degree=dict(zip(nodes, degree.astype(int).tolist())),
+            clustering=dict(zip(nodes, clustering.tolist())),
+            cc_2nd=dict(zip(nodes, cc_2nd.tolist())),
+            centrality={},
+        )
+        state.centrality = {
+            n: cls._centrality(state.degree[n], state.clustering[n], state.cc_2nd[n]) for n in nodes
+        }
+        return state
+
+    def update(
+        self,
+        graph: nx.Graph,
+        added_edges: Iterable[Tuple[Any, Any]],
+        removed_edges: Iterable[Tuple[Any, Any]],
+    ) -> "BerahmandState":
+        """
+        Update the state after edges of the graph have changed.
+
+        Only nodes within two hops of the changed edges are touched: degrees
+        change for endpoints E of the edges, clustering coefficients and sets
+        of second-order neighbours for R = E and their neighbours. Sums of
+        clustering coefficients of nodes outside R are shifted by a change of
+        clustering of nodes from R in their second-order neighbourhood.
+
+        :param graph: an undirected graph after the change
+        :param added_edges: edges that have been added to the graph
+        :param removed_edges: edges that have been removed from the graph
+        :return: a new, updated state
+        """
+        if graph.is_directed():
+            raise ValueError("Graph must be undirected!")
+        degree, clustering, cc_2nd = self.degree.copy(), self.clustering.copy(), self.cc_2nd.copy()
+        centrality = self.centrality.copy()
+
+        # nodes that vanished from the graph are dropped, new ones are touched
+        for node in set(degree).difference(graph.nodes()):
+            for container in (degree, clustering, cc_2nd, centrality):
+                del container[node]
+        endpoints = {n for edge in (*added_edges, *removed_edges) for n in edge if n in graph}
+        endpoints.update(n for n in graph.nodes() if n not in degree)
+        touched = endpoints.union(*[{*nx.neighbors(graph, n)} for n in endpoints])
+
+        # update clustering of touched nodes and shift sums of their 2nd-order
+        # neighbours which won't be recomputed
+        shifted = set()
+        for node, cc_node in nx.clustering(graph, [*touched]).items():
+            delta = cc_node - clustering.get(node, 0)
+            clustering[node] = cc_node
+            if delta == 0:
+                continue
+            for neighbour in _neighbours_2nd(graph, node).difference(touched):
+                cc_2nd[neighbour] += delta
+                shifted.add(neighbour)
+
+        # recompute components of touched nodes from scratch
+        for node in touched:
+            degree[node] = graph.degree(node)
+            cc_2nd[node] = sum([clustering[n] for n in _neighbours_2nd(graph, node)])
+        for node in touched.union(shifted):
+            centrality[node] = self._centrality(degree[node], clustering[node], cc_2nd[node])
+
+        return BerahmandState(degree=degree, clustering=clustering, cc_2nd=cc_2nd, centrality=centrality)
+
+
+def diff_edges(
+    graph_prev: nx.Graph, graph_next: nx.Graph
+) -> Tuple[List[Tuple[Any, Any]], List[Tuple[Any, Any]]]:
+    """
+    Compute edges added and removed between two undirected graphs.
+
+    :return: a tuple with lists of added and removed edges
+    """
+    edges_prev = {frozenset(edge) for edge in graph_prev.edges()}
+    edges_next = {frozenset(edge) for edge in graph_next.edges()}
+    added = [(*edge, *edge)[:2] for edge in edges_next.difference(edges_prev)]
+    removed = [(*edge, *edge)[:2] for edge in edges_prev.difference(edges_next)]
+    return added, removed
+
+
+def berahmand_centrality_temporal(net: nd.TemporalNetwork, layer_name: str = "layer_1") -> List[Dict[Any, float]]:
+    """
+    Compute Berahmand centrailty for each snapshot of the temporal network.
+
+    The centrality is computed from scratch only for the first snapshot and
+    then updated by differences between consecutive snapshots. Directed
+    snapshots are treated as undirected.
+
+    :param net: a temporal network
+    :param layer_name: a name of the layer to compute centrality for
+    :return: list of centrality dicts, one for each snapshot
+    """
+    graphs = [
+        snap[layer_name].to_undirected(as_view=True) if snap[layer_name].is_directed() else snap[layer_name]
+        for snap in net.snaps
+    ]
+    state = BerahmandState.from_graph(graphs[0])
+    centralities = [state.centrality]
+    for graph_prev, graph_next in zip(graphs[:-1], graphs[1:]):
+        state = state.update(graph_next, *diff_edges(graph_prev, graph_next))
+        centralities.append(state.centrality)
+    return centralities
+
+
 class BerahmandCentralitySelector(nd.seeding.base_selector.BaseSeedSelector):
     """Seed selector based on Berahmand centrailty algorithm."""
 
@@ -54,7 +262,10 @@ class BerahmandCentralitySelector(nd.seeding.base_selector.BaseSeedSelector):
         :param graph: single layer graph to compute ranking for
         :return: list of node-ids ordered descending by their ranking position
         """
-        ranking_dict = berahmand_centrality(graph=graph)
+        if graph.is_directed():
+            ranking_dict = berahmand_centrality(graph=graph)
+        else:
+            ranking_dict = berahmand_centrality_sparse(graph=graph)
         ranked_nodes = sorted(ranking_dict, key=lambda x: ranking_dict[x], reverse=True)
         if len(ranked_nodes) != len(graph.nodes): raise ValueError
         return ranked_nodes
@@ -108,6 +319,14 @@ if __name__ =="__main__":
     ]
     G = nx.from_edgelist(edge_list)
 
+    # check if the vectorised implementation returns the same values, also
+    # for a graph with a self-loop and an isolated node
+    G_extended = nx.Graph([*G.edges(), (32, 32)])
+    G_extended.add_node(33)
+    for graph in (G, G_extended):
+        reference, vectorised = berahmand_centrality(graph), berahmand_centrality_sparse(graph)
+        assert all(np.isclose(reference[node], vectorised[node]) for node in graph.nodes())
+
     # visualise it
     import matplotlib.pyplot as plt
     fig, ax = plt.subplots(ncols=1, nrows=1)
@@ -0,0 +1,827 @@
+"""
+Array-backed engines that replace per-node walks over networkx graphs.
+
+Instead of visiting each node of each layer and querying the compartmental
+graph, an engine holds layers as CSR adjacency matrices and states of nodes as
+integer arrays. A whole epoch is computed with a handful of NumPy operations.
+Batched engines go further and advance many replicas of a simulation at once,
+with states of all replicas stored in one matrix. There is also a simulator
+which runs any model of `network_diffusion` without recording local stats.
+"""
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+import networkx as nx
+import network_diffusion as nd
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+from utils.functions import get_rng
+from utils.models import SIR_UAModel
+
+
+class SIR_UAEngine:
+
+    CONTAGION = "contagion"
+    AWARENESS = "awareness"
+
+    def __init__(
+        self,
+        model: SIR_UAModel,
+        net: nd.MultilayerNetwork,
+        seed: Optional[Union[int, np.random.Generator]] = None,
+        stop_on_absorbing: bool = True,
+    ) -> None:
+        """
+        Vectorised counterpart of running `SIR_UAModel` with `nd.Simulator`.
+
+        Both layers are stored as CSR matrices over a common node order. In
+        each epoch a number of infected (aware) neighbours of each node is
+        obtained with a sparse matvec and a probability of the transition is
+        computed as 1 - (1 - p) ^ k, which equals to flipping a coin for each
+        of k active neighbours. As in the model, layers are updated in the
+        order of `net.layers` (awareness first for networks from `networks`),
+        so transition probabilities in the latter layer depend on new states
+        of the former one. Nodes within a layer, however, are updated
+        synchronously with one batched random draw, while the model updates
+        them in place one by one (a node sees states its neighbours got in
+        the same epoch). Use `compare_with_simulator` to check that both
+        agree on the given network before replacing the model with the engine.
+
+        :param model: a model to take transition probabilities and seeding
+            budget from
+        :param net: a multiplex network with layers "contagion" and "awareness"
+        :param seed: a seed or a generator of random numbers; if not provided
+            it is drawn from the global NumPy state
+        :param stop_on_absorbing: a flag whether to stop the simulation as
+            soon as no state can change (see `is_absorbing`) and repeat the
+            final state in the remaining epochs
+        """
+        if not net.is_multiplex():
+            raise ValueError("This model works only with multiplex networks!")
+        self._model = model
+        self._stop_on_absorbing = stop_on_absorbing
+        self._rng = get_rng(seed)
+        self._net = net
+        self._states = model.get_allowed_states(net)
+        self._budget = model.compartments.get_seeding_budget_for_network(net)
+        self.nodes = [*net[self.CONTAGION].nodes()]
+        self.adj_c = self._to_csr(net[self.CONTAGION], self.nodes)
+        self.adj_a = self._to_csr(net[self.AWARENESS], self.nodes)
+        self.p_infect, self.p_recover, self.p_aware = self._get_probabilities(model)
+        self.awareness_first = self._is_awareness_first(net)
+
+    @classmethod
+    def _is_awareness_first(cls, net: nd.MultilayerNetwork) -> bool:
+        """Check if the model updates the awareness layer before the contagion one."""
+        l_names = [*net.layers]
+        return l_names.index(cls.AWARENESS) < l_names.index(cls.CONTAGION)
+
+    @staticmethod
+    def _to_csr(graph: nx.Graph, nodes: List[int]) -> sp.csr_array:
+        """Convert layer to an unweighted adjacency matrix A[i, j] = i -> j."""
+        return nx.to_scipy_sparse_array(graph, nodelist=nodes, weight=None, format="csr")
+
+    @staticmethod
+    def _get_probabilities(model: SIR_UAModel) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Read transition probabilities from the table compiled by the model.
+
+        :return: probabilities of S->I and I->R indexed by awareness state, and
+            probability of U->A indexed by contagion state
+        """
+        compartments = model.compartments.get_compartments()
+        s_c, s_a = compartments["contagion"], compartments["awareness"]
+        p_infect = np.array([model.transitions[("contagion", "S", a)].get("I", 0) for a in s_a])
+        p_recover = np.array([model.transitions[("contagion", "I", a)].get("R", 0) for a in s_a])
+        p_aware = np.array([model.transitions[("awareness", "U", c)].get("A", 0) for c in s_c])
+        return p_infect, p_recover, p_aware
+
+    def determine_initial_states(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Seed randomly I nodes in contagion and A nodes in awareness."""
+        n = len(self.nodes)
+        contagion = np.zeros(n, dtype=np.int8)
+        awareness = np.zeros(n, dtype=np.int8)
+        contagion[self._rng.permutation(n)[:self._budget[self.CONTAGION]["I"]]] = 1
+        awareness[self._rng.permutation(n)[:self._budget[self.AWARENESS]["A"]]] = 1
+        return contagion, awareness
+
+    def network_evaluation_step(
+        self, contagion: np.ndarray, awareness: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Compute states of all nodes in the next epoch.
+
+        :param contagion: states of nodes in contagion layer (0 - S, 1 - I,
+            2 - R)
+        :param awareness: states of nodes in awareness layer (0 - U, 1 - A)
+        :return: updated copies of both arrays
+        """
+        coins = self._rng.random((2, len(contagion)))
+        infected_nbrs = self.adj_c @ (contagion == 1).astype(np.float64)
+        aware_nbrs = self.adj_a @ (awareness == 1).astype(np.float64)
+
+        probabilities = self.p_infect, self.p_recover, self.p_aware
+        return self._next_states(
+            contagion, awareness, infected_nbrs, aware_nbrs, coins, probabilities, self.awareness_first
+        )
+
+    @staticmethod
+    def _next_states(
+        contagion: np.ndarray,
+        awareness: np.ndarray,
+        infected_nbrs: np.ndarray,
+        aware_nbrs: np.ndarray,
+        coins: np.ndarray,
+        probabilities: Tuple[np.ndarray, np.ndarray, np.ndarray],
+        awareness_first: bool,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Draw new states of nodes, updating layers one after another.
+
+        :param contagion: states of nodes in contagion layer
+        :param awareness: states of nodes in awareness layer
+        :param infected_nbrs: numbers of infected neighbours of nodes
+        :param aware_nbrs: numbers of aware neighbours of nodes
+        :param coins: random numbers to draw transitions in contagion and
+            awareness layers with
+        :param probabilities: probabilities of transitions, see
+            `_get_probabilities`
+        :param awareness_first: a flag whether to update the awareness layer
+            before the contagion one
+        :return: new states of nodes in both layers
+        """
+        p_infect, p_recover, p_aware = probabilities
+
+        def update_contagion(awareness_states: np.ndarray) -> np.ndarray:
+            p_c = np.where(
+                contagion == 0,
+                1 - np.power(1 - p_infect[awareness_states], infected_nbrs),
+                np.where(contagion == 1, p_recover[awareness_states], 0),
+            )
+            return (contagion + (coins[0] < p_c)).astype(np.int8)
+
+        def update_awareness(contagion_states: np.ndarray) -> np.ndarray:
+            p_a = np.where(awareness == 0, 1 - np.power(1 - p_aware[contagion_states], aware_nbrs), 0)
+            return (awareness + (coins[1] < p_a)).astype(np.int8)
+
+        # the latter layer depends on new states of the former one
+        if awareness_first:
+            new_awareness = update_awareness(contagion)
+            return update_contagion(new_awareness), new_awareness
+        new_contagion = update_contagion(awareness)
+        return new_contagion, update_awareness(new_contagion)
+
+    def is_absorbing(self, contagion: np.ndarray, awareness: np.ndarray) -> bool:
+        """
+        Check if states of nodes cannot change anymore.
+
+        It is the case when there are no infected nodes and no unaware node
+        has an aware neighbour and a non-zero probability of U->A, see
+        `SIR_UAModel.get_frontier`.
+        """
+        if (contagion == 1).any():
+            return False
+        can_become_aware = (awareness == 0) & (self.p_aware[contagion] > 0)
+        if not can_become_aware.any():
+            return True
+        aware_nbrs = self.adj_a @ (awareness == 1).astype(np.float64)
+        return not (can_become_aware & (aware_nbrs > 0)).any()
+
+    def _count_states(self, contagion: np.ndarray, awareness: np.ndarray) -> Dict[str, np.ndarray]:
+        return {
+            self.CONTAGION: np.bincount(contagion, minlength=len(self._states[self.CONTAGION])),
+            self.AWARENESS: np.bincount(awareness, minlength=len(self._states[self.AWARENESS])),
+        }
+
+    def perform_propagation(self, n_epochs: int, patience: Optional[int] = None) -> nd.Logger:
+        """
+        Perform the simulation.
+
+        :param n_epochs: number of epochs to do experiment
+        :param patience: if provided experiment will be stopped when in
+            "patience" consecutive epochs no node changed its state
+        :return: logs with the same global stats as `nd.Simulator` produces;
+            local stats are not recorded
+        """
+        if patience is not None and patience <= 0:
+            raise ValueError("Patience must be None or integer > 0!")
+        contagion, awareness = self.determine_initial_states()
+        counts = [self._count_states(contagion, awareness)]
+        stopping_counter = 0
+        for _ in range(n_epochs):
+            new_contagion, new_awareness = self.network_evaluation_step(contagion, awareness)
+            counts.append(self._count_states(new_contagion, new_awareness))
+            no_change = (new_contagion == contagion).all() and (new_awareness == awareness).all()
+            contagion, awareness = new_contagion, new_awareness
+
+            # check if there is no progress and therefore stop simulation
+            if patience:
+                stopping_counter = stopping_counter + 1 if no_change else 0
+                if stopping_counter >= patience:
+                    break
+
+            # check if no state can change anymore and therefore skip the rest
+            if self._stop_on_absorbing and self.is_absorbing(contagion, awareness):
+                counts = pad_global_stats(counts, get_padded_length(len(counts), n_epochs, patience, stopping_counter))
+                break
+
+        descriptions = str(self._model), str(self._net)
+        return logs_from_counts(
+            descriptions, self._states, {l_name: np.array([c[l_name] for c in counts]) for l_name in self._states}
+        )
+
+
+def compare_with_simulator(
+    model: SIR_UAModel,
+    net: nd.MultilayerNetwork,
+    n_epochs: int,
+    n_repetitions: int,
+    seed: Optional[Union[int, np.random.Generator]] = None,
+) -> pd.DataFrame:
+    """
+    Compare final states of runs of `SIR_UAEngine` with ones of `nd.Simulator`.
+
+    :param model: a model to simulate
+    :param net: a network to run simulations on
+    :param n_epochs: number of epochs of each run
+    :param n_repetitions: number of runs of each simulator
+    :param seed: a seed or a generator of random numbers of the engine
+    :return: a dataframe with means and standard deviations of numbers of
+        nodes in each state at the end of runs, indexed by layers and states,
+        and with z-scores of differences between the means
+    """
+    engine = SIR_UAEngine(model, net, seed=seed)
+    finals = {"engine": [], "simulator": []}
+    for _ in range(n_repetitions):
+        for name, logs in (
+            ("engine", engine.perform_propagation(n_epochs)),
+            ("simulator", nd.Simulator(model, net).perform_propagation(n_epochs)),
+        ):
+            finals[name].append(
+                pd.concat({l_name: stats.iloc[-1] for l_name, stats in logs._global_stats_converted.items()})
+            )
+    records = {}
+    for name, runs in finals.items():
+        runs = pd.DataFrame(runs)
+        records[f"{name}_mean"], records[f"{name}_std"] = runs.mean(), runs.std()
+    comparison = pd.DataFrame(records)
+    difference = comparison["engine_mean"] - comparison["simulator_mean"]
+    std_error = np.sqrt((comparison["engine_std"] ** 2 + comparison["simulator_std"] ** 2) / n_repetitions)
+    # equal means of states which do not vary are not a difference
+    comparison["z"] = (difference / std_error).where(std_error > 0, np.where(difference == 0, 0, np.inf))
+    return comparison
+
+
+def get_padded_length(length: int, n_epochs: int, patience: Optional[int], stopping_counter: int) -> int:
+    """
+    Compute a number of entries of global stats of a run stopped in an absorbing state.
+
+    It is the length the logs would have if the run went on: `n_epochs + 1`,
+    unless the patience runs out earlier since no state changes anymore.
+
+    :param length: number of entries logged so far
+    :param n_epochs: number of epochs of the simulation
+    :param patience: see `nd.Simulator.perform_propagation`
+    :param stopping_counter: number of consecutive epochs without progress
+        counted so far
+    """
+    if patience:
+        return min(n_epochs + 1, length + patience - stopping_counter)
+    return n_epochs + 1
+
+
+def pad_global_stats(global_stats: List[Any], length: int) -> List[Any]:
+    """
+    Repeat the final entry of global stats of a run stopped in an absorbing state.
+
+    :param global_stats: global stats of epochs that were run
+    :param length: desired number of entries, see `get_padded_length`
+    :return: a list with `length` entries (or more, if already longer)
+    """
+    return [*global_stats, *[global_stats[-1]] * (length - len(global_stats))]
+
+
+def logs_from_counts(
+    descriptions: Tuple[str, str], allowed_states: Dict[str, Tuple[str, ...]], counts: Dict[str, np.ndarray]
+) -> nd.Logger:
+    """
+    Create logs of a run from numbers of nodes in states.
+
+    :param descriptions: descriptions of the model and of the network
+    :param allowed_states: states of each layer, in order of columns of counts
+    :param counts: arrays of shape (epochs, states) keyed by layers
+    :return: logs with the same global stats as `nd.Simulator` produces;
+        local stats are not recorded
+    """
+    logger = nd.Logger(*descriptions)
+    for epoch in range(len(next(iter(counts.values())))):
+        logger.add_global_stat({
+            l_name: tuple(zip(states, counts[l_name][epoch].tolist())) for l_name, states in allowed_states.items()
+        })
+    logger._global_stats_converted = {
+        l_name: pd.DataFrame(counts[l_name], columns=[*states]).astype(int)
+        for l_name, states in allowed_states.items()
+    }
+    return logger
+
+
+def convert_global_stats(
+    global_stats: List[Dict[str, Tuple[Tuple[str, int], ...]]], allowed_states: Dict[str, Tuple[str, ...]]
+) -> Dict[str, pd.DataFrame]:
+    """Convert global stats to dataframes, an equivalent of `nd.Logger.convert_logs`."""
+    return {
+        l_name: pd.DataFrame([dict(epoch[l_name]) for epoch in global_stats], columns=[*states]).fillna(0).astype(int)
+        for l_name, states in allowed_states.items()
+    }
+
+
+class StreamingSimulator(nd.Simulator):
+
+    def __init__(
+        self,
+        model: nd.models.BaseModel,
+        network: Union[nd.MultilayerNetwork, nd.TemporalNetwork],
+        callback: Optional[Callable[[int, nd.MultilayerNetwork, List[nd.models.NetworkUpdateBuffer]], None]] = None,
+        stop_on_absorbing: bool = True,
+    ) -> None:
+        """
+        Counterpart of `nd.Simulator` which does not record local stats.
+
+        Instead of storing states of all nodes in each epoch, they are passed
+        to the callback (if provided) as soon as they are computed, e.g. to
+        `functions.MICMResultsCallback`.
+
+        :param model: model of propagation
+        :param network: a network which is being examined during experiment
+        :param callback: a function called with a number of the epoch, the
+            snapshot that was updated and new states of nodes; epoch 0 is the
+            initialisation
+        :param stop_on_absorbing: a flag whether to stop the simulation on a
+            static network as soon as `model.is_absorbing` (if the model has
+            it, e.g. `SIR_UAModel`) signals that states cannot change anymore;
+            the final state is then repeated, so logs have `n_epochs + 1`
+            entries as if all epochs were run
+        """
+        super().__init__(model, network)
+        self._callback = callback
+        self._stop_on_absorbing = stop_on_absorbing and hasattr(model, "is_absorbing")
+
+    @staticmethod
+    def _update_network(net: nd.MultilayerNetwork, new_states: List[nd.models.NetworkUpdateBuffer]) -> None:
+        """Set new states of nodes, `update_network` of models without logs."""
+        for state in new_states:
+            net.layers[state.layer_name].nodes[state.node_name]["status"] = state.new_state
+
+    def _apply(self, epoch: int, net: nd.MultilayerNetwork, new_states: List[nd.models.NetworkUpdateBuffer]) -> None:
+        self._update_network(net, new_states)
+        if self._callback is not None:
+            self._callback(epoch, net, new_states)
+
+    def perform_propagation(self, n_epochs: int, patience: Optional[int] = None) -> nd.Logger:
+        """
+        Perform the simulation.
+
+        :param n_epochs: number of epochs to do experiment
+        :param patience: see `nd.Simulator.perform_propagation`
+        :return: logs with global stats only
+        """
+        if patience is not None and patience <= 0:
+            raise ValueError("Patience must be None or integer > 0!")
+        snap_iterator, n_epochs = self._create_iterator(n_epochs)
+        logger = nd.Logger(str(self._model), str(self._network))
+
+        initial_states = self._model.determine_initial_states(snap_iterator(0))
+        self._apply(0, snap_iterator(0), initial_states)
+        logger.add_global_stat(self._model.get_states_num(snap_iterator(0)))
+
+        if isinstance(self._network, nd.TemporalNetwork):
+            self._verify_network(self._network, n_epochs)
+
+        # in temporal networks states can be unlocked by edges of next snapshots
+        absorbing_check = self._stop_on_absorbing and not isinstance(self._network, nd.TemporalNetwork)
+        old_states = initial_states
+        for epoch in range(n_epochs):
+            new_states = self._model.network_evaluation_step(snap_iterator(epoch))
+            self._apply(epoch + 1, snap_iterator(epoch + 1), new_states)
+            logger.add_global_stat(self._model.get_states_num(snap_iterator(epoch + 1)))
+
+            # check if there is no progress and therefore stop simulation
+            if patience:
+                self._update_counter(new_states, old_states)
+                if self.stopping_counter >= patience:
+                    break
+                old_states = new_states
+
+            # check if no state can change anymore and therefore skip the rest
+            if absorbing_check and self._model.is_absorbing(snap_iterator(epoch + 1)):
+                length = get_padded_length(len(logger._global_stats), n_epochs, patience, self.stopping_counter)
+                logger._global_stats = pad_global_stats(logger._global_stats, length)
+                break
+
+        logger._global_stats_converted = convert_global_stats(
+            logger._global_stats, self._model.get_allowed_states(snap_iterator(0))
+        )
+        return logger
+
+
+class BatchedEngine(ABC):
+    """
+    Base class of engines which run many independent replicas at once.
+
+    States of nodes of all replicas are stored in (replicas x nodes) integer
+    matrices, so in each epoch the adjacency of a layer is traversed once for
+    all replicas, with a product of a sparse matrix and a dense one. Replicas
+    which have stopped are dropped from the batch.
+    """
+
+    def __init__(
+        self,
+        model: nd.models.BaseModel,
+        net: nd.MultilayerNetwork,
+        n_replicas: int,
+        seed: Optional[Union[int, np.random.Generator]] = None,
+        stop_on_absorbing: bool = True,
+    ) -> None:
+        """
+        Prepare the engine.
+
+        :param model: a model to take parameters from
+        :param net: a network to run simulations on
+        :param n_replicas: number of independent replicas
+        :param seed: a seed or a generator of random numbers; if not provided
+            it is drawn from the global NumPy state
+        :param stop_on_absorbing: a flag whether to stop a replica as soon as
+            it cannot change anymore (see `is_absorbing`) and repeat its final
+            state in the remaining epochs
+        """
+        self._model = model
+        self._stop_on_absorbing = stop_on_absorbing
+        self._rng = get_rng(seed)
+        self._net = net
+        self._states = model.get_allowed_states(net)
+        self.n_replicas = n_replicas
+
+    @abstractmethod
+    def determine_initial_states(self) -> Tuple[np.ndarray, ...]:
+        """Return initial states of all replicas as a tuple of matrices."""
+        ...
+
+    @abstractmethod
+    def network_evaluation_step(self, states: Tuple[np.ndarray, ...]) -> Tuple[np.ndarray, ...]:
+        """Compute states of given replicas in the next epoch."""
+        ...
+
+    @abstractmethod
+    def _count_states(self, states: Tuple[np.ndarray, ...]) -> Dict[str, np.ndarray]:
+        """Return arrays of shape (replicas, states) with numbers of nodes keyed by layers."""
+        ...
+
+    def is_absorbing(self, states: Tuple[np.ndarray, ...]) -> np.ndarray:
+        """Return a mask of replicas which cannot change anymore, none by default."""
+        return np.zeros(len(states[0]), dtype=bool)
+
+    @staticmethod
+    def _random_seeds(rng: np.random.Generator, n_replicas: int, n: int, budget: int) -> np.ndarray:
+        """Get a mask of `budget` nodes drawn independently in each replica."""
+        seeds = np.zeros((n_replicas, n), dtype=bool)
+        chosen = np.argsort(rng.random((n_replicas, n)), axis=1)[:, :budget]
+        np.put_along_axis(seeds, chosen, True, axis=1)
+        return seeds
+
+    def perform_propagation(self, n_epochs: int, patience: Optional[int] = None) -> List[nd.Logger]:
+        """
+        Perform simulations of all replicas.
+
+        :param n_epochs: number of epochs to do experiment
+        :param patience: if provided a replica is stopped when in "patience"
+            consecutive epochs no node changed its state
+        :return: logs of replicas, compatible with `functions.get_metrics`
+            and `functions.get_mean_log`
+        """
+        if patience is not None and patience <= 0:
+            raise ValueError("Patience must be None or integer > 0!")
+        states = self.determine_initial_states()
+        counts = [self._count_states(states)]
+        lengths = np.full(self.n_replicas, n_epochs + 1)
+        running = np.arange(self.n_replicas)
+        stopping_counters = np.zeros(self.n_replicas, dtype=int)
+
+        for epoch in range(n_epochs):
+            if not len(running):
+                break
+            old_states = tuple(matrix[running] for matrix in states)
+            new_states = self.network_evaluation_step(old_states)
+            no_change = np.logical_and.reduce([(old == new).all(axis=1) for old, new in zip(old_states, new_states)])
+            for matrix, new_matrix in zip(states, new_states):
+                matrix[running] = new_matrix
+            counts.append(self._count_states(states))
+            length = epoch + 2
+            stopped = np.zeros(len(running), dtype=bool)
+
+            # check if there is no progress and therefore stop replicas
+            if patience:
+                stopping_counters[running] = np.where(no_change, stopping_counters[running] + 1, 0)
+                stopped = stopping_counters[running] >= patience
+                lengths[running[stopped]] = length
+
+            # check if replicas cannot change anymore and therefore skip the rest
+            if self._stop_on_absorbing:
+                absorbing = ~stopped & self.is_absorbing(new_states)
+                lengths[running[absorbing]] = [
+                    get_padded_length(length, n_epochs, patience, counter)
+                    for counter in stopping_counters[running[absorbing]]
+                ]
+                stopped |= absorbing
+            running = running[~stopped]
+
+        stacked = {l_name: np.stack([c[l_name] for c in counts], axis=1) for l_name in self._states}
+        descriptions = str(self._model), str(self._net)
+        logs = []
+        for replica, length in enumerate(lengths):
+            replica_counts = {l_name: l_counts[replica] for l_name, l_counts in stacked.items()}
+            if len(counts) < length:
+                replica_counts = {
+                    l_name: np.array(pad_global_stats([*l_counts], length))
+                    for l_name, l_counts in replica_counts.items()
+                }
+            logs.append(logs_from_counts(descriptions, self._states, {
+                l_name: l_counts[:length] for l_name, l_counts in replica_counts.items()
+            }))
+        return logs
+
+
+class BatchedSIR_UAEngine(BatchedEngine):
+
+    CONTAGION = SIR_UAEngine.CONTAGION
+    AWARENESS = SIR_UAEngine.AWARENESS
+
+    def __init__(
+        self,
+        model: SIR_UAModel,
+        net: nd.MultilayerNetwork,
+        n_replicas: int,
+        seed: Optional[Union[int, np.random.Generator]] = None,
+        stop_on_absorbing: bool = True,
+    ) -> None:
+        """
+        Batched counterpart of `SIR_UAEngine`, with the same dynamics (and
+        the same limitation of updating nodes of a layer synchronously).
+
+        :param model: a model to take transition probabilities and seeding
+            budget from
+        :param net: a multiplex network with layers "contagion" and "awareness"
+        :param n_replicas: number of independent replicas
+        :param seed: a seed or a generator of random numbers
+        :param stop_on_absorbing: see `BatchedEngine`
+        """
+        if not net.is_multiplex():
+            raise ValueError("This model works only with multiplex networks!")
+        super().__init__(model, net, n_replicas, seed, stop_on_absorbing)
+        self._budget = model.compartments.get_seeding_budget_for_network(net)
+        self.nodes = [*net[self.CONTAGION].nodes()]
+        self.adj_c = SIR_UAEngine._to_csr(net[self.CONTAGION], self.nodes)
+        self.adj_a = SIR_UAEngine._to_csr(net[self.AWARENESS], self.nodes)
+        self.p_infect, self.p_recover, self.p_aware = SIR_UAEngine._get_probabilities(model)
+        self.awareness_first = SIR_UAEngine._is_awareness_first(net)
+
+    def determine_initial_states(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Seed randomly I nodes in contagion and A nodes in awareness of each replica."""
+        n = len(self.nodes)
+        infected = self._random_seeds(self._rng, self.n_replicas, n, self._budget[self.CONTAGION]["I"])
+        aware = self._random_seeds(self._rng, self.n_replicas, n, self._budget[self.AWARENESS]["A"])
+        return infected.astype(np.int8), aware.astype(np.int8)
+
+    def network_evaluation_step(self, states: Tuple[np.ndarray, ...]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Compute states of all nodes of replicas in the next epoch.
+
+        :param states: matrices of states in contagion layer (0 - S, 1 - I,
+            2 - R) and in awareness layer (0 - U, 1 - A), replicas in rows
+        :return: updated copies of both matrices
+        """
+        contagion, awareness = states
+        coins = self._rng.random((2, *contagion.shape))
+        infected_nbrs = (self.adj_c @ (contagion == 1).T.astype(np.float64)).T
+        aware_nbrs = (self.adj_a @ (awareness == 1).T.astype(np.float64)).T
+
+        probabilities = self.p_infect, self.p_recover, self.p_aware
+        return SIR_UAEngine._next_states(
+            contagion, awareness, infected_nbrs, aware_nbrs, coins, probabilities, self.awareness_first
+        )
+
+    def is_absorbing(self, states: Tuple[np.ndarray, ...]) -> np.ndarray:
+        """Return a mask of replicas in absorbing states, see `SIR_UAEngine.is_absorbing`."""
+        contagion, awareness = states
+        can_become_aware = (awareness == 0) & (self.p_aware[contagion] > 0)
+        aware_nbrs = (self.adj_a @ (awareness == 1).T.astype(np.float64)).T
+        return ~(contagion == 1).any(axis=1) & ~(can_become_aware & (aware_nbrs > 0)).any(axis=1)
+
+    def _count_states(self, states: Tuple[np.ndarray, ...]) -> Dict[str, np.ndarray]:
+        return {
+            l_name: np.stack([(l_states == s).sum(axis=1) for s in range(len(self._states[l_name]))], 1)
+            for l_name, l_states in zip((self.CONTAGION, self.AWARENESS), states)
+        }
+
+
+class _BatchedActorEngine(BatchedEngine):
+    """Base class of batched engines of models where all nodes of an actor share the state."""
+
+    PROCESS_NAME = ""
+    ACTIVE_STATE = ""
+
+    def __init__(
+        self,
+        model: nd.models.BaseModel,
+        net: nd.MultilayerNetwork,
+        n_replicas: int,
+        seed: Optional[Union[int, np.random.Generator]] = None,
+        stop_on_absorbing: bool = True,
+    ) -> None:
+        super().__init__(model, net, n_replicas, seed, stop_on_absorbing)
+        self.actors = net.get_actors()
+        index = {actor.actor_id: idx for idx, actor in enumerate(self.actors)}
+        self.adjacencies = {l_name: self._to_actor_csr(l_graph, index) for l_name, l_graph in net.layers.items()}
+        self.members = {
+            l_name: np.isin(np.arange(len(self.actors)), [index[node] for node in l_graph.nodes()])
+            for l_name, l_graph in net.layers.items()
+        }
+        self.protocol = model.protocol.__name__.rsplit("_", 1)[-1].upper()
+        self._budget = model.compartments.get_seeding_budget_for_network(net, actorwise=True)
+        self._seed_ranking = None
+        if not isinstance(model._seed_selector, nd.seeding.RandomSeedSelector):
+            # a deterministic selector chooses the same seeds in each replica
+            ranking = model._seed_selector.actorwise(net)
+            self._seed_ranking = np.array([index[actor.actor_id] for actor in ranking])
+
+    @staticmethod
+    def _to_actor_csr(graph: nx.Graph, index: Dict[Any, int]) -> sp.csr_array:
+        """Convert layer to an unweighted adjacency matrix A[i, j] = i -> j over all actors."""
+        edges = np.array([(index[u], index[v]) for u, v in graph.edges()], dtype=np.int64).reshape(-1, 2)
+        if not graph.is_directed():
+            edges = np.concatenate([edges, edges[:, ::-1]])
+        adjacency = sp.csr_array(
+            (np.ones(len(edges)), (edges[:, 0], edges[:, 1])), shape=(len(index), len(index))
+        )
+        adjacency.sum_duplicates()
+        adjacency.data[:] = 1
+        return adjacency
+
+    def _get_seeds(self) -> np.ndarray:
+        """Get a mask of initially active actors of each replica."""
+        budget = self._budget[self.PROCESS_NAME][self.ACTIVE_STATE]
+        if self._seed_ranking is None:
+            return self._random_seeds(self._rng, self.n_replicas, len(self.actors), budget)
+        seeds = np.zeros((self.n_replicas, len(self.actors)), dtype=bool)
+        seeds[:, self._seed_ranking[:budget]] = True
+        return seeds
+
+    def _combine(self, layer_inputs: Dict[str, np.ndarray]) -> np.ndarray:
+        """Combine positive inputs of actors in layers with the protocol of the model."""
+        if self.protocol == "AND":
+            return np.logical_and.reduce([inputs | ~self.members[l_name] for l_name, inputs in layer_inputs.items()])
+        return np.logical_or.reduce([inputs & self.members[l_name] for l_name, inputs in layer_inputs.items()])
+
+    def _count_states(self, states: Tuple[np.ndarray, ...]) -> Dict[str, np.ndarray]:
+        actor_states, = states
+        return {
+            l_name: np.stack([((actor_states == s) & member).sum(axis=1) for s in range(len(l_states))], 1)
+            for (l_name, l_states), member in zip(self._states.items(), self.members.values())
+        }
+
+
+class BatchedMLTEngine(_BatchedActorEngine):
+
+    PROCESS_NAME = nd.models.MLTModel.PROCESS_NAME
+    ACTIVE_STATE = nd.models.MLTModel.ACTIVE_STATE
+
+    def __init__(
+        self,
+        model: nd.models.MLTModel,
+        net: nd.MultilayerNetwork,
+        n_replicas: int,
+        seed: Optional[Union[int, np.random.Generator]] = None,
+        stop_on_absorbing: bool = True,
+    ) -> None:
+        """
+        Batched counterpart of running `nd.models.MLTModel` with `nd.Simulator`.
+
+        An inactive node gets a positive input if a share of its active
+        neighbours exceeds mi. Shares are summed by the model as floats, so
+        for each node a minimal number of active neighbours that exceeds mi
+        is found with the same arithmetic and compared with numbers of active
+        neighbours of all replicas. Given initial seeds, the dynamics is
+        deterministic and equal to the one of the model.
+
+        :param model: a model to take mi, protocol, seed selector and seeding
+            budget from
+        :param net: a network to run simulations on
+        :param n_replicas: number of independent replicas
+        :param seed: a seed or a generator of random numbers to choose seeds
+        :param stop_on_absorbing: see `BatchedEngine`
+        """
+        super().__init__(model, net, n_replicas, seed, stop_on_absorbing)
+        mi = model._compartmental_graph.get_possible_transitions(
+            (f"{self.PROCESS_NAME}.{model.INACTIVE_STATE}",), self.PROCESS_NAME
+        )[model.ACTIVE_STATE]
+        index = {actor.actor_id: idx for idx, actor in enumerate(self.actors)}
+        self.thresholds = {}
+        for l_name, l_graph in net.layers.items():
+            degrees = np.zeros(len(self.actors), dtype=np.int64)
+            degrees[[index[node] for node in l_graph.nodes()]] = [degree for _, degree in l_graph.degree()]
+            self.thresholds[l_name] = self._get_thresholds(degrees, mi)
+
+    @staticmethod
+    def _get_thresholds(degrees: np.ndarray, mi: float) -> np.ndarray:
+        """Find minimal numbers of active neighbours for which sums of 1 / degree exceed mi."""
+        thresholds = np.full(len(degrees), np.iinfo(np.int64).max)
+        for degree in np.unique(degrees[degrees > 0]).tolist():
+            impulse = 0
+            for k in range(1, degree + 1):
+                impulse += 1 / degree
+                if impulse > mi:
+                    thresholds[degrees == degree] = k
+                    break
+        return thresholds
+
+    def determine_initial_states(self) -> Tuple[np.ndarray]:
+        """Return states of actors (0 - inactive, 1 - active) of all replicas."""
+        return self._get_seeds().astype(np.int8),
+
+    def network_evaluation_step(self, states: Tuple[np.ndarray, ...]) -> Tuple[np.ndarray]:
+        actor_states, = states
+        active = actor_states == 1
+        layer_inputs = {
+            l_name: (adjacency @ active.T.astype(np.float64)).T >= self.thresholds[l_name]
+            for l_name, adjacency in self.adjacencies.items()
+        }
+        return (active | self._combine(layer_inputs)).astype(np.int8),
+
+
+class BatchedMICEngine(_BatchedActorEngine):
+
+    PROCESS_NAME = nd.models.MICModel.PROCESS_NAME
+    ACTIVE_STATE = nd.models.MICModel.ACTIVE_NODE
+
+    def __init__(
+        self,
+        model: nd.models.MICModel,
+        net: nd.MultilayerNetwork,
+        n_replicas: int,
+        seed: Optional[Union[int, np.random.Generator]] = None,
+        stop_on_absorbing: bool = True,
+    ) -> None:
+        """
+        Batched counterpart of running `nd.models.MICModel` with `nd.Simulator`.
+
+        An active actor becomes activated (i.e. it loses its potential) in
+        the next epoch. In each layer an inactive node is activated by each
+        of its k active neighbours if a drawn number is not less than the
+        probability of the model, hence a node gets a positive input with a
+        probability 1 - probability ^ k.
+
+        :param model: a model to take probability, protocol, seed selector
+            and seeding budget from
+        :param net: a network to run simulations on
+        :param n_replicas: number of independent replicas
+        :param seed: a seed or a generator of random numbers
+        :param stop_on_absorbing: see `BatchedEngine`
+        """
+        super().__init__(model, net, n_replicas, seed, stop_on_absorbing)
+        self.probability = model.probability
+
+    def determine_initial_states(self) -> Tuple[np.ndarray]:
+        """
+        Return states of actors of all replicas.
+
+        States are coded by their positions in allowed states of the model,
+        i.e. 0 - inactive, 1 - active, 2 - activated.
+        """
+        return self._get_seeds().astype(np.int8),
+
+    def network_evaluation_step(self, states: Tuple[np.ndarray, ...]) -> Tuple[np.ndarray]:
+        actor_states, = states
+        active = (actor_states == 1).T.astype(np.float64)
+        layer_inputs = {
+            l_name: self._rng.random(actor_states.shape) >= np.power(self.probability, (adjacency @ active).T)
+            for l_name, adjacency in self.adjacencies.items()
+        }
+        activated = (actor_states == 0) & self._combine(layer_inputs)
+        return np.where(actor_states == 1, 2, np.where(activated, 1, actor_states)).astype(np.int8),
+
+    def is_absorbing(self, states: Tuple[np.ndarray, ...]) -> np.ndarray:
+        """Return a mask of replicas without active actors."""
+        actor_states, = states
+        return ~(actor_states == 1).any(axis=1)
+
+
+if __name__ == "__main__":
+    """Check that final states of runs of `SIR_UAEngine` agree with ones of `nd.Simulator`."""
+    from utils import models, networks
+
+    for name, net in (("ER", networks.get_er_net()), ("SF", networks.get_sf_net())):
+        comparison = compare_with_simulator(models.get_sirua(), net, n_epochs=50, n_repetitions=20, seed=42)
+        print(name)
+        print(comparison.round(2).to_string())
+        assert (comparison["z"].abs() < 4).all(), f"SIR_UAEngine disagrees with nd.Simulator on the {name} network"
@@ -1,14 +1,30 @@
 import os
+import pickle
 import random
 
-from typing import List, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import Dict, List, Optional, Sequence, Tuple, Union
 
-import matplotlib.pyplot as plt
 import networkx as nx
 import network_diffusion as nd
 import numpy as np
 import pandas as pd
 
+from utils import loaders
+
+
+# plotting helpers moved to `plotting`, they are imported on first use so that
+# workers which only run simulations do not import matplotlib
+_PLOTTING_FUNCTIONS = ("visualize_results_as_heatmap", "compare_nets")
+
+
+def __getattr__(name):
+    if name in _PLOTTING_FUNCTIONS:
+        from utils import plotting
+        return getattr(plotting, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 def set_seed(seed):
     random.seed(seed)
@@ -16,14 +32,81 @@ def set_seed(seed):
     os.environ["PYTHONHASHSEED"] = str(seed)
 
 
+def get_rng(seed: Optional[Union[int, np.random.Generator]] = None) -> np.random.Generator:
+    """
+    Create a random generator.
+
+    If no seed is given, it is drawn from the global NumPy state, so that runs
+    stay reproducible with `set_seed`.
+    """
+    if isinstance(seed, np.random.Generator):
+        return seed
+    if seed is None:
+        seed = np.random.randint(0, 2 ** 32 - 1)
+    return np.random.default_rng(seed)
+
+
 def convert_micm_logs(logs: nd.Logger, patience: int) -> Tuple[int, int]:
-    dict_last_epoch_state = logs._local_stats[len(logs._local_stats)-1]
-    df_last_epoch_state = pd.DataFrame(dict_last_epoch_state)
-    nb_activated_actors = len(df_last_epoch_state[df_last_epoch_state["new_state"] == '-1']["node_name"].unique())
-    nb_epochs_spread = len(logs._global_stats_converted.popitem()[1]) - 1 - patience
+    """
+    Get number of activated actors and length of the spread from MICModel logs.
+
+    Logs are not modified.
+    """
+    last_epoch_state = logs._local_stats[len(logs._local_stats) - 1]
+    nb_activated_actors = len({
+        change["node_name"] for change in last_epoch_state if change["new_state"] == nd.models.MICModel.ACTIVATED_NODE
+    })
+    nb_epochs_spread = len(logs._global_stats) - 1 - patience
     return nb_activated_actors, nb_epochs_spread
 
 
+def count_actors_in_state(net: nd.MultilayerNetwork, state: str) -> int:
+    """Count actors which are in the state in at least one layer of the network."""
+    return len({
+        node for l_graph in net.layers.values() for node, status in l_graph.nodes(data="status") if status == state
+    })
+
+
+def get_micm_results(logs: nd.Logger, net: nd.MultilayerNetwork, patience: int) -> Tuple[int, int]:
+    """
+    Get the same values as `convert_micm_logs` from the final state of the network.
+
+    It does not need local stats, but has to be called right after the
+    simulation, before states of the network are changed by another one.
+
+    :param logs: logs of the simulation
+    :param net: a network the simulation was performed on
+    :param patience: patience of the simulation
+    :return: number of activated actors and length of the spread
+    """
+    nb_activated_actors = count_actors_in_state(net, nd.models.MICModel.ACTIVATED_NODE)
+    return nb_activated_actors, len(logs._global_stats) - 1 - patience
+
+
+class MICMResultsCallback:
+    """
+    Callback of `engines.StreamingSimulator` that tracks results of MICModel.
+
+    After each epoch it keeps only actors activated in that epoch, so after
+    the simulation `get_results` returns the same values as
+    `convert_micm_logs` applied to complete logs.
+    """
+
+    def __init__(self) -> None:
+        self.last_epoch = 0
+        self.activated_actors: set = set()
+
+    def __call__(self, epoch: int, net: nd.MultilayerNetwork, new_states: List[nd.models.NetworkUpdateBuffer]) -> None:
+        self.last_epoch = epoch
+        self.activated_actors = {
+            state.node_name for state in new_states if state.new_state == nd.models.MICModel.ACTIVATED_NODE
+        }
+
+    def get_results(self, patience: int) -> Tuple[int, int]:
+        """Return number of activated actors and length of the spread."""
+        return len(self.activated_actors), self.last_epoch - patience
+
+
 def get_mean_log(logs: List[pd.DataFrame]):
     base_df = logs[0].copy()
     for _df in logs[1:]:
@@ -39,6 +122,46 @@ def get_std_log(logs: List[pd.DataFrame]):
     return np.sqrt(base_df / len(logs))
 
 
+def stack_logs(logs: List[pd.DataFrame]) -> np.ndarray:
+    """
+    Align logs to a common epoch index and stack them into one array.
+
+    Logs of runs that stopped earlier are padded with their final state.
+
+    :param logs: logs of a layer from many runs with the same columns
+    :return: an array of shape (runs, epochs, states)
+    """
+    columns = logs[0].columns
+    stacked = np.empty((len(logs), max(len(log) for log in logs), len(columns)))
+    for idx, log in enumerate(logs):
+        values = log[columns].to_numpy()
+        stacked[idx, :len(values)] = values
+        stacked[idx, len(values):] = values[-1]
+    return stacked
+
+
+def get_summary_log(
+    logs: List[pd.DataFrame], quantiles: Sequence[float] = (0.05, 0.95)
+) -> Dict[Union[str, float], pd.DataFrame]:
+    """
+    Compute mean, std and quantiles of logs in one vectorised pass.
+
+    :param logs: logs of a layer from many runs with the same columns
+    :param quantiles: quantiles to compute, e.g. for confidence bands
+    :return: a dict keyed by "mean", "std" and values of quantiles
+    """
+    stacked = stack_logs(logs)
+    columns = logs[0].columns
+    summary: Dict[Union[str, float], pd.DataFrame] = {
+        "mean": pd.DataFrame(stacked.mean(axis=0), columns=columns),
+        "std": pd.DataFrame(stacked.std(axis=0), columns=columns),
+    }
+    if len(quantiles) > 0:
+        for q, q_values in zip(quantiles, np.quantile(stacked, quantiles, axis=0)):
+            summary[q] = pd.DataFrame(q_values, columns=columns)
+    return summary
+
+
 def get_metrics(experiment_results):
     epochs_vals = []
     start_A_vals = []
@@ -61,97 +184,310 @@ def get_metrics(experiment_results):
     return epochs, start_A, start_B, final_A, final_B
 
 
-def visualize_results_as_heatmap(results_df, index, columns, values, title, normalize=True, colorbar_label=None,
-                                 x_label=None, y_label=None):
-    methods = sorted(results_df['method'].unique())
-    fig, axes = plt.subplots(1, len(methods), figsize=(12, 6))
-    fig.suptitle(title, fontsize=16)
-
-    if normalize:
-        agents_sum = sum([results_df[c][0] for c in results_df.columns if c.startswith('start_')])
-        for c in results_df.columns:
-            if c.startswith('start_') or c.startswith('final_'):
-                results_df[c] = results_df[c]/agents_sum
-
-    vmin = results_df[values].min()
-    vmax = results_df[values].max()
-
-    for i, method in enumerate(methods):
-        ax = axes[i]
-        df = results_df[results_df['method'] == method]
-        pivot_df = df.pivot_table(index=index, columns=columns, values=values)
-
-        # Convert the pivot table data to a NumPy array
-        heatmap_data = pivot_df.to_numpy()
-
-        # Define the x and y labels
-        x_labels = pivot_df.columns
-        y_labels = pivot_df.index
-
-        # Create a heatmap using pure matplotlib
-        im = ax.imshow(heatmap_data, cmap='coolwarm', interpolation='nearest', vmin=vmin, vmax=vmax)
-
-        # Set the x and y labels
-        ax.set_xticks(np.arange(len(x_labels)))
-        ax.set_yticks(np.arange(len(y_labels)))
-        ax.set_xticklabels(x_labels)
-        ax.set_yticklabels(y_labels)
-
-        # Display the colorbar
-        cbar = fig.colorbar(im, ax=ax)
-        label = colorbar_label if colorbar_label else values
-        cbar.set_label(label)
-
-        for j in range(len(y_labels)):
-            for k in range(len(x_labels)):
-                ax.text(k, j, "{:.2f}".format(heatmap_data[j, k]), ha='center', va='center', color='black')
-
-        # Set labels for the x and y axes
-        x_label = x_label if x_label else columns
-        ax.set_xlabel(x_label)
-        y_label = y_label if y_label else index
-        ax.set_ylabel(y_label)
-        ax.set_title(method)
-
-    plt.tight_layout(rect=[0, 0, 1, 0.92])
-    # Show the heatmap
-    plt.show()
-
-
-def preprocess_temporal_network(network, theta, undirected=False):
+class LogsAccumulator:
+    """
+    Online aggregator of global stats of simulation runs.
+
+    Each run is consumed as soon as it finishes, so the memory footprint is
+    O(epochs x states) regardless of number of runs. Per each layer, epoch and
+    state it keeps a running mean and a sum of squared deviations (Welford's
+    algorithm). Runs shorter than others are treated as having 0 agents in the
+    missing epochs, as `get_mean_log` does.
+    """
+
+    def __init__(self) -> None:
+        self.runs_nb = 0
+        self._columns: Dict[str, List[str]] = {}
+        self._counts: Dict[str, np.ndarray] = {}
+        self._means: Dict[str, np.ndarray] = {}
+        self._m2s: Dict[str, np.ndarray] = {}
+        self._epochs_sum = 0
+        self._start_sum = np.zeros(2)
+        self._final_sum = np.zeros(2)
+
+    def add(self, logs: Union[nd.Logger, Dict[str, pd.DataFrame]]) -> None:
+        """
+        Consume global stats of a single run.
+
+        :param logs: logs of the run or its `_global_stats_converted` field
+        """
+        if isinstance(logs, nd.Logger):
+            logs = logs._global_stats_converted
+        for layer, log in logs.items():
+            self._add_layer(layer, log)
+
+        # metrics as in `get_metrics` are computed for the first layer
+        first_log = next(iter(logs.values()))
+        self._epochs_sum += first_log.shape[0]
+        self._start_sum += first_log.iloc[0, :2].to_numpy()
+        self._final_sum += first_log.iloc[-1, :2].to_numpy()
+        self.runs_nb += 1
+
+    def _add_layer(self, layer: str, log: pd.DataFrame) -> None:
+        if layer not in self._columns:
+            self._columns[layer] = [*log.columns]
+            self._counts[layer] = np.zeros(0)
+            self._means[layer] = np.zeros((0, log.shape[1]))
+            self._m2s[layer] = np.zeros((0, log.shape[1]))
+        values = log[self._columns[layer]].to_numpy(dtype=np.float64)
+        epochs_nb = values.shape[0]
+
+        # extend containers if the run is longer than ones seen so far
+        if epochs_nb > len(self._counts[layer]):
+            missing = epochs_nb - len(self._counts[layer])
+            self._counts[layer] = np.pad(self._counts[layer], (0, missing))
+            self._means[layer] = np.pad(self._means[layer], ((0, missing), (0, 0)))
+            self._m2s[layer] = np.pad(self._m2s[layer], ((0, missing), (0, 0)))
+
+        count = self._counts[layer][:epochs_nb]
+        mean = self._means[layer][:epochs_nb]
+        count += 1
+        delta = values - mean
+        mean += delta / count[:, None]
+        self._m2s[layer][:epochs_nb] += delta * (values - mean)
+
+    def _finalise(self, layer: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Merge stats of runs with zeros for epochs the runs did not reach."""
+        count = self._counts[layer][:, None]
+        mean = self._means[layer] * count / self.runs_nb
+        m2 = self._m2s[layer] + self._means[layer] ** 2 * count * (self.runs_nb - count) / self.runs_nb
+        return mean, m2
+
+    def get_mean_log(self, layer: str) -> pd.DataFrame:
+        """Return a mean log of the layer, an equivalent of `get_mean_log`."""
+        mean, _ = self._finalise(layer)
+        return pd.DataFrame(mean, columns=self._columns[layer])
+
+    def get_std_log(self, layer: str) -> pd.DataFrame:
+        """Return a std log of the layer, an equivalent of `get_std_log`."""
+        _, m2 = self._finalise(layer)
+        return pd.DataFrame(np.sqrt(m2 / self.runs_nb), columns=self._columns[layer])
+
+    def get_metrics(self) -> Tuple[float, float, float, float, float]:
+        """Return metrics of consumed runs, an equivalent of `get_metrics`."""
+        epochs = self._epochs_sum / self.runs_nb
+        start_A, start_B = self._start_sum / self.runs_nb
+        final_A, final_B = self._final_sum / self.runs_nb
+        return epochs, start_A, start_B, final_A, final_B
+
+
+def _encode(values: Sequence) -> Tuple[np.ndarray, np.ndarray]:
+    """Dictionary-encode values, return codes and a vocabulary of them."""
+    codes, vocabulary = pd.factorize(pd.Series(values, dtype=object))
+    vocabulary = np.asarray(vocabulary.tolist())
+    if vocabulary.dtype == object:
+        vocabulary = vocabulary.astype(str)
+    return codes.astype(np.int32), vocabulary
+
+
+def save_logs(logs: List[nd.Logger], path: str, local_stats: bool = False) -> None:
+    """
+    Save logs of many runs in a compressed columnar `.npz` file.
+
+    Global stats of each layer are stored as one array of counts (epochs of
+    all runs x states) with lengths of runs in a separate array. Local stats
+    are stored as columns of run, epoch, layer, node and state, where the last
+    three are dictionary-encoded. Other fields of logs are not preserved.
+
+    :param logs: logs of runs of the same model
+    :param path: path to the file
+    :param local_stats: a flag whether to store also changes of nodes' states
+    """
+    if not logs:
+        raise ValueError("There are no logs to save!")
+    layers = [*logs[0]._global_stats_converted.keys()]
+    description_codes, descriptions = _encode(
+        [f"{log._model_description}\0{log._network_description}" for log in logs]
+    )
+    arrays = {
+        "layers": np.array(layers, dtype=str),
+        "run_lengths": np.array([len(log._global_stats_converted[layers[0]]) for log in logs], dtype=np.int32),
+        "description_codes": description_codes,
+        "descriptions": descriptions,
+    }
+    for l_idx, layer in enumerate(layers):
+        states = [*logs[0]._global_stats_converted[layer].columns]
+        arrays[f"states_{l_idx}"] = np.array(states, dtype=str)
+        arrays[f"global_{l_idx}"] = np.concatenate(
+            [log._global_stats_converted[layer][states].to_numpy(dtype=np.int32) for log in logs]
+        )
+
+    if local_stats:
+        records = [
+            (run, epoch, change["layer_name"], change["node_name"], change["new_state"])
+            for run, log in enumerate(logs)
+            for epoch, changes in log._local_stats.items()
+            for change in changes
+        ]
+        runs, epochs, l_names, nodes, states = zip(*records) if records else ([], [], [], [], [])
+        arrays["local_run"] = np.array(runs, dtype=np.int32)
+        arrays["local_epoch"] = np.array(epochs, dtype=np.int32)
+        arrays["local_layer"], arrays["local_layer_vocabulary"] = _encode(l_names)
+        arrays["local_node"], arrays["local_node_vocabulary"] = _encode(nodes)
+        arrays["local_state"], arrays["local_state_vocabulary"] = _encode(states)
+
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, "wb") as file:
+        np.savez_compressed(file, **arrays)
+    os.replace(tmp_path, path)
+
+
+def read_metrics(path: str) -> Tuple[float, float, float, float, float]:
+    """
+    Compute `get_metrics` of logs saved with `save_logs`.
+
+    Only lengths of runs and counts of the first layer are read.
+    """
+    with np.load(path) as data:
+        lengths = data["run_lengths"]
+        counts = data["global_0"]
+    ends = np.cumsum(lengths)
+    starts = ends - lengths
+    return (
+        np.mean(lengths),
+        np.mean(counts[starts, 0]),
+        np.mean(counts[starts, 1]),
+        np.mean(counts[ends - 1, 0]),
+        np.mean(counts[ends - 1, 1]),
+    )
+
+
+def read_global_stats(path: str, layers: Optional[Sequence[str]] = None) -> List[Dict[str, pd.DataFrame]]:
+    """
+    Read global stats of logs saved with `save_logs`.
+
+    :param path: path to the file
+    :param layers: names of layers to read, all by default
+    :return: `_global_stats_converted` of each run, which can be passed e.g.
+        to `LogsAccumulator.add`
+    """
+    with np.load(path) as data:
+        all_layers = data["layers"].tolist()
+        ends = np.cumsum(data["run_lengths"])
+        layers_stats = {
+            layer: (data[f"states_{l_idx}"].tolist(), data[f"global_{l_idx}"].astype(int))
+            for l_idx, layer in enumerate(all_layers)
+            if layers is None or layer in layers
+        }
+    return [
+        {
+            layer: pd.DataFrame(counts[end - length:end], columns=states)
+            for layer, (states, counts) in layers_stats.items()
+        }
+        for end, length in zip(ends, np.diff(ends, prepend=0))
+    ]
+
+
+def load_logs(path: str) -> List[nd.Logger]:
+    """Load logs saved with `save_logs` as `nd.Logger` objects."""
+    global_stats = read_global_stats(path)
+    with np.load(path) as data:
+        descriptions = data["descriptions"][data["description_codes"]].tolist()
+        local_stats: Dict[int, Dict[int, List[Dict[str, str]]]] = {}
+        if "local_run" in data:
+            l_names = data["local_layer_vocabulary"][data["local_layer"]].tolist()
+            nodes = data["local_node_vocabulary"][data["local_node"]].tolist()
+            states = data["local_state_vocabulary"][data["local_state"]].tolist()
+            for run, epoch, l_name, node, state in zip(
+                data["local_run"].tolist(), data["local_epoch"].tolist(), l_names, nodes, states
+            ):
+                run_stats = local_stats.setdefault(run, {})
+                run_stats.setdefault(epoch, []).append(
+                    {"layer_name": l_name, "node_name": node, "new_state": state}
+                )
+
+    logs = []
+    for run, (run_stats, description) in enumerate(zip(global_stats, descriptions)):
+        log = nd.Logger(*description.split("\0", 1))
+        epochs_nb = len(next(iter(run_stats.values())))
+        for epoch in range(epochs_nb):
+            log.add_global_stat({
+                layer: tuple((state, count) for state, count in stats.iloc[epoch].items() if count > 0)
+                for layer, stats in run_stats.items()
+            })
+        log._global_stats_converted = run_stats
+        log._local_stats = local_stats.get(run, {})
+        logs.append(log)
+    return logs
+
+
+def convert_pickled_logs(pickle_path: str, path: Optional[str] = None, local_stats: bool = False) -> str:
+    """
+    Convert a pickled list of `nd.Logger` objects to a file read by `load_logs`.
+
+    :param pickle_path: path to the pickle, e.g. a file from `results` directory
+        of CogSNet experiments
+    :param path: path to the new file, by default the pickle's one with `.npz`
+        extension
+    :param local_stats: a flag whether to store also changes of nodes' states
+    :return: path to the new file
+    """
+    with open(pickle_path, "rb") as file:
+        logs = pickle.load(file)
+    path = path or f"{os.path.splitext(pickle_path)[0]}.npz"
+    save_logs(logs, path, local_stats)
+    return path
+
+
+def _filter_layer(graph: nx.Graph, theta: float, undirected: bool) -> Optional[nx.Graph]:
+    """
+    Drop self-loops and edges with weight not greater than theta.
+
+    :return: a new layer or None if nothing would change
+    """
+    edges = [*graph.edges(data="weight", default=np.inf)]
+    sources = np.array([e[0] for e in edges])
+    targets = np.array([e[1] for e in edges])
+    weights = np.fromiter((e[2] for e in edges), dtype=np.float64, count=len(edges))
+    keep = (sources != targets) & (weights > theta)
+    to_undirected = undirected and graph.is_directed()
+    if keep.all() and not to_undirected:
+        return None
+    filtered_graph = nx.Graph() if to_undirected else graph.__class__()
+    filtered_graph.graph.update(graph.graph)
+    filtered_graph.add_nodes_from(graph.nodes(data=True))
+    filtered_graph.add_weighted_edges_from(edge for edge, kept in zip(edges, keep.tolist()) if kept)
+    return filtered_graph
+
+
+def preprocess_temporal_network(network, theta, undirected=False, inplace=True, n_jobs=None):
+    """
+    Drop self-loops and edges with weight <= theta from all snapshots.
+
+    Edge lists of snapshots are filtered with NumPy masks and layers are
+    rebuilt in bulk. Snapshots which do not change are left untouched.
+
+    :param network: a temporal network, e.g. obtained with CogSNet
+    :param theta: edges with weights not greater than it are dropped
+    :param undirected: a flag whether to convert snapshots to undirected ones
+    :param inplace: if True snapshots of the network are updated, otherwise a
+        new network is returned which shares unchanged snapshots with the
+        original one (e.g. to sweep theta over the same network)
+    :param n_jobs: if greater than 1, snapshots are filtered in that many
+        processes
+    :return: preprocessed network
+    """
     layer_name = list(network.snaps[0].layers.keys())[0]
-    for snap in network.snaps:
-        # 1. Drop selfloops
-        snap[layer_name].remove_edges_from(nx.selfloop_edges(snap[layer_name]))
-
-        # 2. Drop edges below theta
-        drop_edges = list(filter(lambda e: e[2] <= theta, (e for e in snap[layer_name].edges.data('weight'))))
-        drop_edges_ids = list(e[:2] for e in drop_edges)
-        snap[layer_name].remove_edges_from(drop_edges_ids)
-        if undirected:
-            snap.layers[layer_name] = snap.layers[layer_name].to_undirected()
-    return network
-
-
-def compare_nets(n1, n2):
-    n1_layer_name = list(n1.snaps[0].layers.keys())[0]
-    n2_layer_name = list(n2.snaps[0].layers.keys())[0]
-    n1_edges_no = []
-    n2_edges_no = []
-    snapshots = list(zip(n1.snaps, n2.snaps))
-    for s1, s2 in snapshots:
-        n1_edges_no.append(len(s1[n1_layer_name].edges))
-        n2_edges_no.append(len(s2[n2_layer_name].edges))
-    x = list(range(0, len(snapshots)))
-    plt.plot(x, n1_edges_no)
-    plt.plot(x, n2_edges_no)
-    plt.show()
+    layers = [snap[layer_name] for snap in network.snaps]
+    if n_jobs is not None and n_jobs > 1:
+        with ProcessPoolExecutor(n_jobs) as executor:
+            filtered = list(executor.map(_filter_layer, layers, repeat(theta), repeat(undirected)))
+    else:
+        filtered = [_filter_layer(layer, theta, undirected) for layer in layers]
+
+    if inplace:
+        for snap, layer in zip(network.snaps, filtered):
+            if layer is not None:
+                snap.layers[layer_name] = layer
+        return network
+    return nd.TemporalNetwork([
+        snap if layer is None else nd.MultilayerNetwork({**snap.layers, layer_name: layer})
+        for snap, layer in zip(network.snaps, filtered)
+    ])
 
 
 def create_static_network(event_data_path: str, delimiter: str, undirected=False, source='Sender', target='Recipient'):
-    df_interactions = pd.read_csv(event_data_path, delimiter=delimiter)
-    df_interactions = df_interactions[[source, target]]
     method = nx.Graph if undirected else nx.DiGraph
-    static_graph = nx.from_pandas_edgelist(df_interactions, source=source, target=target, create_using=method)
+    static_graph = loaders.read_static_network(event_data_path, delimiter, source, target, create_using=method)
     static_graph.remove_edges_from(nx.selfloop_edges(static_graph))
     return static_graph
@@ -0,0 +1,151 @@
+"""
+Bulk loaders of edge lists.
+
+Files are parsed by the C engine of pandas with only needed columns and
+optional types, then each layer is built with a single `add_edges_from` call.
+In the chunked mode a file is read in parts, so it does not have to fit in
+memory at once (only the resulting graphs do).
+"""
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Type
+
+import networkx as nx
+import network_diffusion as nd
+import numpy as np
+import pandas as pd
+
+
+def read_table(
+    path: str,
+    usecols: Sequence[Any],
+    names: Optional[Sequence[str]] = None,
+    delimiter: str = ",",
+    dtype: Optional[Dict[str, Any]] = None,
+    chunksize: Optional[int] = None,
+) -> Iterable[pd.DataFrame]:
+    """
+    Read selected columns of a csv file at once or in chunks.
+
+    :param path: path to the file
+    :param usecols: columns to read
+    :param names: names of columns if the file has no header
+    :param delimiter: a delimiter of the file
+    :param dtype: types of columns
+    :param chunksize: if provided the file is read in chunks of that many rows
+    :return: an iterable of dataframes
+    """
+    table = pd.read_csv(
+        path,
+        sep=delimiter,
+        names=names,
+        header=None if names is not None else "infer",
+        usecols=usecols,
+        dtype=dtype,
+        chunksize=chunksize,
+        engine="c",
+    )
+    return table if chunksize else [table]
+
+
+def add_edges_from_array(graph: nx.Graph, edges: np.ndarray) -> nx.Graph:
+    """
+    Add edges stored as an array of shape (m, 2) to the graph.
+
+    :param graph: a graph to extend
+    :param edges: an array with source and target nodes in columns
+    :return: the extended graph
+    """
+    graph.add_edges_from(zip(edges[:, 0].tolist(), edges[:, 1].tolist()))
+    return graph
+
+
+def read_multilayer_edge_list(
+    path: str,
+    names: Sequence[str] = ("node_1", "node_2", "layer"),
+    delimiter: str = ",",
+    dtype: Optional[Dict[str, Any]] = None,
+    create_using: Type[nx.Graph] = nx.Graph,
+    chunksize: Optional[int] = None,
+) -> nd.MultilayerNetwork:
+    """
+    Load a multilayer network from an edge list with a layer column.
+
+    The file should have no header and rows in the form of: SRC,DST,LAYER (e.g.
+    the Lazega `.edges` file). Layers and nodes are created in the order of
+    their appearance in the file.
+
+    :param path: path to the file
+    :param names: names of source, target and layer columns
+    :param delimiter: a delimiter of the file
+    :param dtype: types of columns
+    :param create_using: a class of layers
+    :param chunksize: if provided the file is read in chunks of that many rows
+    """
+    source, target, layer = names
+    layers: Dict[Any, nx.Graph] = {}
+    for chunk in read_table(path, names, names, delimiter, dtype, chunksize):
+        for l_name, l_edges in chunk.groupby(layer, sort=False):
+            if l_name not in layers:
+                layers[l_name] = create_using()
+            add_edges_from_array(layers[l_name], l_edges[[source, target]].to_numpy())
+    return nd.MultilayerNetwork.from_nx_layers(
+        layer_names=[*layers.keys()], network_list=[*layers.values()]
+    )
+
+
+def read_edge_array(
+    path: str,
+    source: str = "Sender",
+    target: str = "Recipient",
+    delimiter: str = ";",
+    dtype: Optional[Any] = None,
+    chunksize: Optional[int] = None,
+) -> np.ndarray:
+    """
+    Read source and target columns of an event file (e.g. used by CogSNet).
+
+    :param path: path to the file with a header
+    :param source: a name of the source column
+    :param target: a name of the target column
+    :param delimiter: a delimiter of the file
+    :param dtype: a type of node ids
+    :param chunksize: if provided the file is read in chunks of that many rows
+        and duplicated edges are dropped from each chunk
+    :return: an array of shape (m, 2) with edges in order of events
+    """
+    columns_dtype = {source: dtype, target: dtype} if dtype is not None else None
+    chunks: List[np.ndarray] = []
+    for chunk in read_table(path, [source, target], None, delimiter, columns_dtype, chunksize):
+        if chunksize:
+            chunk = chunk.drop_duplicates()
+        chunks.append(chunk[[source, target]].to_numpy())
+    if not chunks:
+        # a file without rows may yield no chunks at all
+        return np.empty((0, 2), dtype=dtype if dtype is not None else object)
+    return np.concatenate(chunks) if len(chunks) > 1 else chunks[0]
+
+
+def read_static_network(
+    path: str,
+    delimiter: str = ";",
+    source: str = "Sender",
+    target: str = "Recipient",
+    create_using: Type[nx.Graph] = nx.DiGraph,
+    dtype: Optional[Any] = None,
+    chunksize: Optional[int] = None,
+) -> nx.Graph:
+    """
+    Aggregate all events from the file into one graph.
+
+    :param path: path to the file with a header
+    :param delimiter: a delimiter of the file
+    :param source: a name of the source column
+    :param target: a name of the target column
+    :param create_using: a class of the graph
+    :param dtype: a type of node ids
+    :param chunksize: if provided the file is read in chunks of that many rows
+    """
+    columns_dtype = {source: dtype, target: dtype} if dtype is not None else None
+    graph = create_using()
+    for chunk in read_table(path, [source, target], None, delimiter, columns_dtype, chunksize):
+        add_edges_from_array(graph, chunk[[source, target]].to_numpy())
+    return graph
@@ -1,4 +1,4 @@
-from typing import Dict, List, Tuple
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
 
 import networkx as nx
 import network_diffusion as nd
@@ -6,9 +6,59 @@ import numpy as np
 
 from network_diffusion.models.utils.compartmental import CompartmentalGraph
 
+from utils.functions import get_rng
+
+
+class RandomStream:
+
+    def __init__(self, rng: np.random.Generator, block_size: int = 4096) -> None:
+        """
+        A buffer of uniform variates from [0, 1) refilled in blocks.
+
+        Drawing numbers one by one from a buffer is much cheaper than calling
+        NumPy for each of them.
+
+        :param rng: a generator to draw blocks of numbers from
+        :param block_size: how many numbers are drawn at once
+        """
+        self.rng = rng
+        self.block_size = block_size
+        self._buffer: List[float] = []
+        self._position = 0
+
+    def random(self) -> float:
+        """Return the next number from the stream."""
+        if self._position == len(self._buffer):
+            self._buffer = self.rng.random(self.block_size).tolist()
+            self._position = 0
+        value = self._buffer[self._position]
+        self._position += 1
+        return value
+
+
+class GeneratorSeedSelector(nd.seeding.RandomSeedSelector):
+    """Randomised seed selector driven by a NumPy generator."""
+
+    def __init__(self, rng: np.random.Generator) -> None:
+        super().__init__()
+        self.rng = rng
+
+    def _shuffle(self, items: List[Any]) -> List[Any]:
+        return [items[idx] for idx in self.rng.permutation(len(items))]
+
+    def nodewise(self, net: nd.MultilayerNetwork) -> Dict[str, List[Any]]:
+        """Create nodewise ranking."""
+        return {l_name: self._shuffle([*l_graph.nodes()]) for l_name, l_graph in net.layers.items()}
+
+    def actorwise(self, net: nd.MultilayerNetwork) -> List[nd.MLNetworkActor]:
+        """Get actors randomly."""
+        return self._shuffle(net.get_actors())
+
 
 class SIR_UAModel(nd.models.BaseModel):
 
+    OTHER_LAYER = {"contagion": "awareness", "awareness": "contagion"}
+
     def __init__(
             self,
             alpha: int,
@@ -20,6 +70,8 @@ class SIR_UAModel(nd.models.BaseModel):
             epsilon: int,
             ill_seeds: int,
             aware_seeds: int,
+            seed: Optional[Union[int, np.random.Generator]] = None,
+            dynamic_transitions: bool = False,
     ) -> None:
         """
         A model SIR~UA.
@@ -48,11 +100,21 @@ class SIR_UAModel(nd.models.BaseModel):
         :param epsilon: probability of U->A for removed nodes
         :param ill_seeds: % of initially I nodes
         :param aware_seeds: % of initially A nodes
+        :param seed: a seed or a generator for random numbers used to choose
+            seeds and to flip coins; if not provided it is drawn from the
+            global NumPy state
+        :param dynamic_transitions: if True, possible transitions are obtained
+            from the compartmental graph for each evaluated node instead of
+            from the table compiled at construction (useful for validation)
         """
         compartments = self._create_compartments(
             alpha, beta, alpha_prime, beta_prime, gamma, delta, epsilon, ill_seeds, aware_seeds
         )
-        super().__init__(compartments, nd.seeding.RandomSeedSelector())
+        rng = get_rng(seed)
+        self._random_stream = RandomStream(rng)
+        super().__init__(compartments, GeneratorSeedSelector(rng))
+        self._dynamic_transitions = dynamic_transitions
+        self._transitions = self._compile_transitions(compartments)
 
     @staticmethod
     def _create_compartments(
@@ -98,6 +160,34 @@ class SIR_UAModel(nd.models.BaseModel):
         
         return cg
 
+    @classmethod
+    def _compile_transitions(
+        cls, cg: CompartmentalGraph
+    ) -> Dict[Tuple[str, str, str], Dict[str, float]]:
+        """
+        Compile the compartmental graph into a table of possible transitions.
+
+        :param cg: compiled compartmental graph of the model
+        :return: a dict keyed by (layer, current state, state in the other
+            layer) and valued by {reachable state: probability}, with entries
+            for all joint states
+        """
+        compartments = cg.get_compartments()
+        transitions = {}
+        for layer_name, other_layer in cls.OTHER_LAYER.items():
+            for state in compartments[layer_name]:
+                for other_state in compartments[other_layer]:
+                    actor_state = tuple(sorted([f"{layer_name}.{state}", f"{other_layer}.{other_state}"]))
+                    transitions[(layer_name, state, other_state)] = cg.get_possible_transitions(
+                        actor_state, layer_name
+                    )
+        return transitions
+
+    @property
+    def transitions(self) -> Dict[Tuple[str, str, str], Dict[str, float]]:
+        """Return table of possible transitions compiled at construction."""
+        return self._transitions
+
     def __str__(self) -> str:
         descr = f"{nd.utils.BOLD_UNDERLINE}\SIR-UA Model"
         descr += f"\n{nd.utils.THIN_UNDERLINE}\n"
@@ -136,22 +226,24 @@ class SIR_UAModel(nd.models.BaseModel):
     
         return initial_states
 
-    @staticmethod
-    def flip_a_coin(prob_success: int) -> bool:
-        result = np.random.choice([0, 1], p=[1 - prob_success, prob_success])
-        if result == 1:
-            return True
-        else:
-            return False
+    def flip_a_coin(self, prob_success: float) -> bool:
+        return self._random_stream.random() < prob_success
+
+    def get_possible_transitions(self, agent: int, layer_name: str, net: nd.MultilayerNetwork) -> Dict[str, float]:
+        if self._dynamic_transitions:
+            return self._compartmental_graph.get_possible_transitions(
+                net.get_actor(agent).states_as_compartmental_graph(), layer_name
+            )
+        current_state = net[layer_name].nodes[agent]["status"]
+        other_state = net[self.OTHER_LAYER[layer_name]].nodes[agent]["status"]
+        return self._transitions[(layer_name, current_state, other_state)]
 
     def agent_evaluation_step(self, agent: int, layer_name: str, net: nd.MultilayerNetwork) -> str:
         layer_graph: nx.Graph = net[layer_name]
 
         # get possible transitions for state of the node
         current_state = layer_graph.nodes[agent]["status"]
-        transitions = self._compartmental_graph.get_possible_transitions(
-            net.get_actor(agent).states_as_compartmental_graph(), layer_name
-        )
+        transitions = self.get_possible_transitions(agent, layer_name, net)
 
         # if there is no possible transition don't do anything
         if len(transitions) == 0:
@@ -175,6 +267,10 @@ class SIR_UAModel(nd.models.BaseModel):
     def network_evaluation_step(self, net: nd.MultilayerNetwork) -> List[nd.models.NetworkUpdateBuffer]:
         new_states = []
         for layer_name, layer_graph in net.layers.items():
+            # without infected nodes states in contagion layer are frozen and
+            # its sweep wouldn't even flip a coin, so it can be skipped
+            if layer_name == "contagion" and not self.has_infected(net):
+                continue
             for node in layer_graph.nodes():
                 new_state = self.agent_evaluation_step(node, layer_name, net)
                 # print(layer_graph.nodes[node]["status"], "->", new_state)
@@ -184,6 +280,49 @@ class SIR_UAModel(nd.models.BaseModel):
     def get_allowed_states(self, net: nd.MultilayerNetwork) -> Dict[str, Tuple[str, ...]]:
         return self._compartmental_graph.get_compartments()
 
+    @staticmethod
+    def has_infected(net: nd.MultilayerNetwork) -> bool:
+        """Check if there is any infected node in the network."""
+        return any(state == "I" for _, state in net["contagion"].nodes(data="status"))
+
+    def _iter_frontier(self, net: nd.MultilayerNetwork) -> Iterator[Tuple[str, Any]]:
+        """Yield active nodes lazily, infected ones first since they are cheap to find."""
+        contagion, awareness = net["contagion"], net["awareness"]
+        for node, state in contagion.nodes(data="status"):
+            if state == "I":
+                yield "contagion", node
+        for node, state in awareness.nodes(data="status"):
+            if state != "U" or self._transitions[("awareness", "U", contagion.nodes[node]["status"])].get("A", 0) == 0:
+                continue
+            if any(awareness.nodes[neighbour]["status"] == "A" for neighbour in nx.neighbors(awareness, node)):
+                yield "awareness", node
+
+    def get_frontier(self, net: nd.MultilayerNetwork) -> Dict[str, List[Any]]:
+        """
+        Get nodes which can still change states of the network.
+
+        These are infected nodes (they can infect neighbours or recover) and
+        unaware nodes which have an aware neighbour and a non-zero probability
+        of U->A. Suspected nodes can be infected only by infected neighbours,
+        and R and A are final states, so the rest of the network cannot evolve.
+
+        :param net: a network with states of nodes set
+        :return: lists of active nodes keyed by layer names
+        """
+        frontier: Dict[str, List[Any]] = {"contagion": [], "awareness": []}
+        for layer_name, node in self._iter_frontier(net):
+            frontier[layer_name].append(node)
+        return frontier
+
+    def is_absorbing(self, net: nd.MultilayerNetwork) -> bool:
+        """
+        Check if the network is in an absorbing state, i.e. the frontier is empty.
+
+        It stops at the first active node found, so it is much cheaper than an
+        evaluation step while the spreading is still ongoing.
+        """
+        return next(self._iter_frontier(net), None) is None
+
 
 def get_ltm():
     return nd.models.MLTModel(
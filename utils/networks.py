@@ -1,39 +1,51 @@
+import copy
+import errno
+import functools
+import hashlib
+import json
+import os
+import shutil
+
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
+
 import networkx as nx
 import network_diffusion as nd
+import numpy as np
 import pandas as pd
+import scipy.sparse as sp
+
+from utils import loaders
 
 
 def _network_from_pandas(path):
-    df = pd.read_csv(path, names=["node_1", "node_2", "layer"])
-    net_dict = {l_name: nx.Graph() for l_name in [*df["layer"].unique()]}
-    for _, row in df.iterrows():
-        net_dict[row["layer"]].add_edge(row["node_1"], row["node_2"])
-    return nd.MultilayerNetwork.from_nx_layers(
-        layer_names=[*net_dict.keys()], network_list=[*net_dict.values()]
-    )
+    return loaders.read_multilayer_edge_list(path, names=["node_1", "node_2", "layer"])
 
 
-def get_er_net():
-    layer_c = nx.erdos_renyi_graph(n=1000, p=0.005)
-    layer_a = nx.erdos_renyi_graph(n=1000, p=0.05)
+def get_er_net(n=1000, p_contagion=0.005, p_awareness=0.05):
+    layer_c = nx.erdos_renyi_graph(n=n, p=p_contagion)
+    layer_a = nx.erdos_renyi_graph(n=n, p=p_awareness)
     return nd.MultilayerNetwork.from_nx_layers(
         [layer_a, layer_c], ["awareness", "contagion"]
     )
 
 
-def get_sf_net():
-    layer_c = nx.DiGraph(nx.scale_free_graph(n=1000, alpha=0.41, beta=0.54, gamma=0.05))
-    layer_a = nx.DiGraph(nx.scale_free_graph(n=1000, alpha=0.41, beta=0.54, gamma=0.05))
+def get_sf_net(n=1000):
+    layer_c = nx.DiGraph(nx.scale_free_graph(n=n, alpha=0.41, beta=0.54, gamma=0.05))
+    layer_a = nx.DiGraph(nx.scale_free_graph(n=n, alpha=0.41, beta=0.54, gamma=0.05))
     return nd.MultilayerNetwork.from_nx_layers(
         [layer_a, layer_c], ["awareness", "contagion"]
     )
 
 
-def get_aucs_network():
+def get_aucs_network(cache_dir=None):
+    if cache_dir is not None:
+        return cached_network(get_aucs_network, "data/aucs.mpx", cache_dir)
     return nd.MultilayerNetwork.from_mpx(file_path="data/aucs.mpx")
 
 
-def get_aucs_2_network():
+def get_aucs_2_network(cache_dir=None):
+    if cache_dir is not None:
+        return cached_network(get_aucs_2_network, "data/aucs.mpx", cache_dir)
     net = nd.MultilayerNetwork.from_mpx(file_path="data/aucs.mpx")
     net.layers.pop('coauthor')
     net.layers.pop('work')
@@ -47,3 +59,650 @@ def get_lazega_network():
     return _network_from_pandas(
         "data/Lazega-Law-Firm_4NoNatureNoLoops.edges"
     )
+
+
+def get_cogsnet_network(
+    forgetting_type, snapshot_interval, edge_lifetime, mu, theta, units, path_events, delimiter, cache_dir=None
+):
+    params = dict(
+        forgetting_type=forgetting_type,
+        snapshot_interval=snapshot_interval,
+        edge_lifetime=edge_lifetime,
+        mu=mu,
+        theta=theta,
+        units=units,
+        path_events=path_events,
+        delimiter=delimiter,
+    )
+    if cache_dir is not None:
+        return cached_network(get_cogsnet_network, path_events, cache_dir, **params)
+    return nd.TemporalNetwork.from_cogsnet(**params)
+
+
+COGSNET_FORGETTING_TYPES = ("exponential", "power", "linear")
+
+
+def _get_cogsnet_lambda(forgetting_type: str, edge_lifetime: int, mu: np.float32, theta: np.float32) -> np.float32:
+    """Compute a rate of forgetting as CogSNet does, `edge_lifetime` in seconds."""
+    if forgetting_type == "exponential":
+        return np.float32(1.0 / edge_lifetime * np.log(np.float64(mu / theta)))
+    if forgetting_type == "power":
+        return np.float32(np.log(np.float64(mu / theta)) * np.log(edge_lifetime))
+    return np.float32(1.0 / edge_lifetime * np.float64(mu - theta))
+
+
+def _cogsnet_weights(
+    forgetting_type: str,
+    weights: np.ndarray,
+    elapsed: np.ndarray,
+    lam: np.float32,
+    mu: np.float32,
+    theta: np.float32,
+    units: int,
+    new_event: bool,
+) -> np.ndarray:
+    """
+    Compute weights of edges after the time elapsed from their last events.
+
+    It is a vectorised `compute_weight` of the reference C implementation with
+    the same float32 arithmetic, so weights are bit-identical to the ones of
+    `nd.TemporalNetwork.from_cogsnet`.
+
+    :param weights: float32 weights of edges right after their last events
+    :param elapsed: seconds since last events of edges
+    :param new_event: a flag whether the weight is reinforced by a new event
+    :return: float32 weights, zeroed if not greater than theta
+    """
+    elapsed = elapsed.astype(np.float32) / np.float32(units)
+    one_minus_mu = np.float32(1) - mu
+    if forgetting_type == "exponential":
+        decayed = weights.astype(np.float64) * np.exp((-lam * elapsed).astype(np.float64))
+        new_weights = (mu + decayed * one_minus_mu if new_event else decayed).astype(np.float32)
+    elif forgetting_type == "power":
+        # events closer than one unit are not forgotten (nor reinforced)
+        decayed = weights.astype(np.float64) * np.power(np.maximum(elapsed, 1).astype(np.float64), -np.float64(lam))
+        decayed = mu + decayed * one_minus_mu if new_event else decayed
+        new_weights = np.where(elapsed >= 1, decayed.astype(np.float32), weights)
+    else:
+        decayed = weights - elapsed * lam
+        new_weights = mu + decayed * one_minus_mu if new_event else decayed
+    return np.where(new_weights <= theta, np.float32(0), new_weights).astype(np.float32)
+
+
+def _read_events(path: str, delimiter: str, chunksize: Optional[int]) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Read events in chronological order, as pairs of arrays with nodes and times.
+
+    Columns are taken by positions (SRC, DST, TIME) as in CogSNet. If the file
+    is read at once it is sorted (stably) by time, otherwise each chunk is and
+    chunks have to follow each other chronologically.
+    """
+    last_time = None
+    for chunk in loaders.read_table(path, [0, 1, 2], None, delimiter, None, chunksize):
+        events = chunk.to_numpy(dtype=np.int64)
+        if not len(events):
+            continue
+        events = events[np.argsort(events[:, 2], kind="stable")]
+        if last_time is not None and events[0, 2] < last_time:
+            raise ValueError("Chunks of events have to be in chronological order!")
+        last_time = events[-1, 2]
+        yield events[:, :2], events[:, 2]
+
+
+class _CogSNetState:
+    """Weights and times of last events of pairs of nodes seen so far."""
+
+    def __init__(self) -> None:
+        self.nodes = pd.Index([], dtype=np.int64)
+        self.pairs = pd.Index([], dtype=np.int64)
+        self.weights = np.zeros(0, dtype=np.float32)
+        self.last_times = np.zeros(0, dtype=np.int64)
+
+    @staticmethod
+    def _extend(index: pd.Index, values: np.ndarray) -> Tuple[pd.Index, np.ndarray]:
+        """Append new values to the index in order of appearance, return codes of values."""
+        codes = index.get_indexer(values)
+        if (codes < 0).any():
+            index = index.append(pd.Index(pd.unique(values[codes < 0])))
+            codes = index.get_indexer(values)
+        return index, codes
+
+    def get_pairs(self, nodes: np.ndarray) -> np.ndarray:
+        """Get ids of unordered pairs of nodes of events, register new nodes and pairs."""
+        # nodes are numbered as in CogSNet, i.e. in order of appearance
+        self.nodes, codes = self._extend(self.nodes, nodes.ravel())
+        codes = codes.reshape(-1, 2)
+        keys = np.minimum(codes[:, 0], codes[:, 1]) << 32 | np.maximum(codes[:, 0], codes[:, 1])
+        self.pairs, pairs = self._extend(self.pairs, keys)
+        n_new = len(self.pairs) - len(self.weights)
+        self.weights = np.concatenate([self.weights, np.zeros(n_new, dtype=np.float32)])
+        self.last_times = np.concatenate([self.last_times, np.zeros(n_new, dtype=np.int64)])
+        return pairs
+
+    def apply(self, pairs: np.ndarray, times: np.ndarray, weights: np.ndarray) -> None:
+        """Set the state after the events, given in chronological order."""
+        last = len(pairs) - 1 - np.unique(pairs[::-1], return_index=True)[1]
+        self.weights[pairs[last]] = weights[last]
+        self.last_times[pairs[last]] = times[last]
+
+    def get_endpoints(self, pairs: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Get codes of nodes of pairs, the first one is always the lower one."""
+        keys = self.pairs.to_numpy()[pairs]
+        return keys >> 32, keys & (2 ** 32 - 1)
+
+
+def _reinforce(
+    pairs: np.ndarray,
+    times: np.ndarray,
+    state: _CogSNetState,
+    reinforce_fn: Callable[[np.ndarray, np.ndarray], np.ndarray],
+    mu: np.float32,
+) -> np.ndarray:
+    """
+    Compute weights of pairs right after each event.
+
+    A weight depends on the one after the previous event of the same pair, so
+    events are grouped by pairs and k-th events of all pairs are computed at
+    once; there are as many rounds as events of the most active pair.
+
+    :param pairs: ids of pairs of events in chronological order
+    :param times: times of events
+    :param state: a state before the events
+    :param reinforce_fn: a function of weights and elapsed times which
+        computes reinforced weights
+    :param mu: a weight of a new edge
+    :return: float32 weights in order of events
+    """
+    order = np.argsort(pairs, kind="stable")
+    sorted_pairs, sorted_times = pairs[order], times[order]
+    starts = np.flatnonzero(np.r_[True, sorted_pairs[1:] != sorted_pairs[:-1]])
+    lengths = np.diff(np.r_[starts, len(sorted_pairs)])
+    sorted_weights = np.empty(len(sorted_pairs), dtype=np.float32)
+    groups = np.arange(len(starts))
+    for k in range(lengths.max(initial=0)):
+        groups = groups[lengths[groups] > k]
+        positions = starts[groups] + k
+        if k == 0:
+            prev_weights = state.weights[sorted_pairs[positions]]
+            prev_times = state.last_times[sorted_pairs[positions]]
+        else:
+            prev_weights, prev_times = sorted_weights[positions - 1], sorted_times[positions - 1]
+        # a pair without an edge (e.g. it has been cut off) starts from mu
+        sorted_weights[positions] = np.where(
+            prev_weights == 0, mu, reinforce_fn(prev_weights, sorted_times[positions] - prev_times)
+        )
+    weights = np.empty_like(sorted_weights)
+    weights[order] = sorted_weights
+    return weights
+
+
+def _cogsnet_snapshot(
+    state: _CogSNetState, time: int, decay_fn: Callable[[np.ndarray, np.ndarray], np.ndarray]
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Get edges of the snapshot, i.e. pairs of distinct nodes with weights above theta."""
+    alive = np.flatnonzero(state.weights > 0)
+    weights = decay_fn(state.weights[alive], time - state.last_times[alive])
+    kept = alive[weights > 0]
+    sources, targets = state.get_endpoints(kept)
+    not_loop = sources != targets
+    return sources[not_loop], targets[not_loop], weights[weights > 0][not_loop]
+
+
+def _cogsnet_layer(
+    nodes: np.ndarray, edges: Tuple[np.ndarray, np.ndarray, np.ndarray], undirected: bool
+) -> nx.Graph:
+    """Build a layer with all nodes and edges ordered as in CogSNet snapshots."""
+    sources, targets, weights = edges
+    if not undirected:
+        sources, targets = np.r_[sources, targets], np.r_[targets, sources]
+        weights = np.r_[weights, weights]
+    order = np.lexsort((targets, sources))
+    graph = nx.Graph() if undirected else nx.DiGraph()
+    graph.add_nodes_from(nodes.tolist())
+    graph.add_weighted_edges_from(zip(
+        nodes[sources[order]].tolist(), nodes[targets[order]].tolist(), weights[order].tolist()
+    ))
+    return graph
+
+
+def build_cogsnet_network(
+    forgetting_type: str,
+    snapshot_interval: int,
+    edge_lifetime: int,
+    mu: float,
+    theta: float,
+    units: int,
+    path_events: str,
+    delimiter: str,
+    undirected: bool = False,
+    chunksize: Optional[int] = None,
+    cache_dir: Optional[str] = None,
+) -> nd.TemporalNetwork:
+    """
+    Build CogSNet from events, an equivalent of `get_cogsnet_network` followed by
+    `functions.preprocess_temporal_network`.
+
+    Weights are computed only for pairs of nodes which have interacted, with
+    NumPy over all pairs at once (events between snapshots are applied in
+    bulk), and edges with weights not greater than theta and self-loops are
+    dropped while snapshots are created. Weights are bit-identical to the
+    reference implementation and so are orders of nodes and edges in layers,
+    hence simulations on both networks give the same results.
+
+    Snapshots are taken as in CogSNet: every `snapshot_interval` starting from
+    the first event (or at each distinct time of events if it is 0), and the
+    last one after all events. Each of them contains all nodes of the network.
+
+    :param forgetting_type: "exponential", "power" or "linear"
+    :param snapshot_interval: interval between snapshots in `units`
+    :param edge_lifetime: time in `units` after which an edge with a single
+        event disappears
+    :param mu: a weight of a new edge and a reinforcement of an existing one,
+        from (0, 1]
+    :param theta: a cutoff of weights, from [0, mu)
+    :param units: 1 (seconds), 60 (minutes) or 3600 (hours)
+    :param path_events: a path to a csv file with a header and columns SRC,
+        DST and TIME (in seconds); events don't have to be sorted
+    :param delimiter: a delimiter of the file
+    :param undirected: a flag whether to create undirected layers, as
+        `preprocess_temporal_network` with `undirected=True`
+    :param chunksize: if provided events are read and processed in chunks of
+        that many rows, so only the state of pairs of nodes and edges of
+        snapshots are kept in memory; the file has to be sorted by time then
+    :param cache_dir: if provided the network is cached, see `cached_network`
+    :return: a temporal network with a layer "layer_1" in each snapshot
+    """
+    params = dict(
+        forgetting_type=forgetting_type,
+        snapshot_interval=snapshot_interval,
+        edge_lifetime=edge_lifetime,
+        mu=mu,
+        theta=theta,
+        units=units,
+        path_events=path_events,
+        delimiter=delimiter,
+        undirected=undirected,
+        chunksize=chunksize,
+    )
+    if cache_dir is not None:
+        return cached_network(build_cogsnet_network, path_events, cache_dir, **params)
+
+    if forgetting_type not in COGSNET_FORGETTING_TYPES:
+        raise ValueError(f"Forgetting type has to be one of {COGSNET_FORGETTING_TYPES}!")
+    if snapshot_interval < 0 or edge_lifetime <= 0:
+        raise ValueError("Snapshot interval has to be >= 0 and edge lifetime > 0!")
+    if not 0 < mu <= 1 or not 0 <= theta < mu:
+        raise ValueError("Parameters have to satisfy 0 < mu <= 1 and 0 <= theta < mu!")
+    if units not in (1, 60, 3600):
+        raise ValueError("Units have to be 1, 60 or 3600!")
+
+    mu, theta = np.float32(mu), np.float32(theta)
+    interval = snapshot_interval * units
+    lam = _get_cogsnet_lambda(forgetting_type, edge_lifetime * units, mu, theta)
+    weight_fn = functools.partial(
+        _cogsnet_weights, forgetting_type, lam=lam, mu=mu, theta=theta, units=units
+    )
+    reinforce_fn = functools.partial(weight_fn, new_event=True)
+    decay_fn = functools.partial(weight_fn, new_event=False)
+
+    state = _CogSNetState()
+    snapshots: List[Tuple[np.ndarray, np.ndarray, np.ndarray]] = []
+    snapshot_time = None
+    for nodes, times in _read_events(path_events, delimiter, chunksize):
+        pairs = state.get_pairs(nodes)
+        weights = _reinforce(pairs, times, state, reinforce_fn, mu)
+        if snapshot_time is None:
+            snapshot_time = times[0] + interval
+
+        # a snapshot is complete once a later event is read
+        applied = 0
+        while snapshot_time < times[-1]:
+            end = np.searchsorted(times, snapshot_time, side="right")
+            state.apply(pairs[applied:end], times[applied:end], weights[applied:end])
+            applied = end
+            snapshots.append(_cogsnet_snapshot(state, snapshot_time, decay_fn))
+            snapshot_time = snapshot_time + interval if interval else times[end]
+        state.apply(pairs[applied:], times[applied:], weights[applied:])
+
+    if snapshot_time is None:
+        raise ValueError(f"No events to read in {path_events}!")
+    snapshots.append(_cogsnet_snapshot(state, snapshot_time, decay_fn))
+
+    nodes = state.nodes.to_numpy()
+    return nd.TemporalNetwork([
+        nd.MultilayerNetwork({"layer_1": _cogsnet_layer(nodes, edges, undirected)}) for edges in snapshots
+    ])
+
+
+def _layer_to_csr(graph: nx.Graph) -> Tuple[np.ndarray, sp.csr_array, bool]:
+    """Convert layer to CSR keeping order of nodes and of their neighbours."""
+    nodes = [*graph.nodes()]
+    index = {node: idx for idx, node in enumerate(nodes)}
+    indptr, indices, weights = [0], [], []
+    weighted = False
+    for node in nodes:
+        for neighbour, attrs in graph.adj[node].items():
+            indices.append(index[neighbour])
+            weights.append(attrs.get("weight", 1.0))
+            weighted = weighted or "weight" in attrs
+        indptr.append(len(indices))
+    # use the same index type as scipy would, so that loaded arrays are not
+    # converted (and copied from the memory map)
+    index_dtype = np.int32 if len(indices) < 2 ** 31 else np.int64
+    csr = sp.csr_array(
+        (
+            np.array(weights, dtype=np.float64),
+            np.array(indices, dtype=index_dtype),
+            np.array(indptr, dtype=index_dtype),
+        ),
+        shape=(len(nodes), len(nodes)),
+    )
+    return np.asarray(nodes), csr, weighted
+
+
+def _csr_to_layer(nodes: np.ndarray, csr: sp.csr_array, directed: bool, weighted: bool) -> nx.Graph:
+    graph = nx.DiGraph() if directed else nx.Graph()
+    node_ids = nodes.tolist()
+    graph.add_nodes_from(node_ids)
+    rows = np.repeat(np.arange(len(node_ids)), np.diff(csr.indptr))
+    sources = [node_ids[idx] for idx in rows.tolist()]
+    targets = [node_ids[idx] for idx in csr.indices.tolist()]
+    if weighted:
+        graph.add_weighted_edges_from(zip(sources, targets, csr.data.tolist()))
+    else:
+        graph.add_edges_from(zip(sources, targets))
+    return graph
+
+
+def save_network(net: Union[nd.MultilayerNetwork, nd.TemporalNetwork], path: str) -> None:
+    """
+    Save the network in a binary format.
+
+    Each layer of each snapshot is stored as CSR arrays (indptr, indices and
+    weights) and an array of node ids in separate `.npy` files, so that they
+    can be memory-mapped when loaded. Only "weight" attributes of edges are
+    preserved.
+
+    :param net: a network to save
+    :param path: a directory to save the network in
+    """
+    os.makedirs(path, exist_ok=True)
+    snaps = net.snaps if isinstance(net, nd.TemporalNetwork) else [net]
+    meta: Dict[str, Any] = {"temporal": isinstance(net, nd.TemporalNetwork), "snaps": []}
+    for s_idx, snap in enumerate(snaps):
+        snap_meta = []
+        for l_idx, (l_name, l_graph) in enumerate(snap.layers.items()):
+            nodes, csr, weighted = _layer_to_csr(l_graph)
+            prefix = os.path.join(path, f"s{s_idx}_l{l_idx}")
+            np.save(f"{prefix}_nodes.npy", nodes)
+            np.save(f"{prefix}_indptr.npy", csr.indptr)
+            np.save(f"{prefix}_indices.npy", csr.indices)
+            if weighted:
+                np.save(f"{prefix}_weights.npy", csr.data)
+            snap_meta.append({"name": l_name, "directed": l_graph.is_directed(), "weighted": weighted})
+        meta["snaps"].append(snap_meta)
+    with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as file:
+        json.dump(meta, file)
+
+
+def load_csr_layers(path: str, mmap: bool = True) -> List[Dict[str, Tuple[np.ndarray, sp.csr_array]]]:
+    """
+    Load layers of the network saved with `save_network` as CSR matrices.
+
+    :param path: a directory with the saved network
+    :param mmap: a flag whether to memory-map arrays instead of reading them,
+        so that processes loading the same file share one read-only copy
+    :return: list of snapshots, each one as a dict keyed by layer names with
+        node ids and adjacency matrix in values
+    """
+    with open(os.path.join(path, "meta.json"), encoding="utf-8") as file:
+        meta = json.load(file)
+    mmap_mode = "r" if mmap else None
+    snaps = []
+    for s_idx, snap_meta in enumerate(meta["snaps"]):
+        layers = {}
+        for l_idx, l_meta in enumerate(snap_meta):
+            prefix = os.path.join(path, f"s{s_idx}_l{l_idx}")
+            nodes = np.load(f"{prefix}_nodes.npy", mmap_mode=mmap_mode, allow_pickle=True)
+            indptr = np.load(f"{prefix}_indptr.npy", mmap_mode=mmap_mode)
+            indices = np.load(f"{prefix}_indices.npy", mmap_mode=mmap_mode)
+            if l_meta["weighted"]:
+                weights = np.load(f"{prefix}_weights.npy", mmap_mode=mmap_mode)
+            else:
+                weights = np.ones(len(indices))
+            csr = sp.csr_array((weights, indices, indptr), shape=(len(nodes), len(nodes)), copy=False)
+            layers[l_meta["name"]] = (nodes, csr)
+        snaps.append(layers)
+    return snaps
+
+
+def load_network(path: str, mmap: bool = True) -> Union[nd.MultilayerNetwork, nd.TemporalNetwork]:
+    """
+    Load the network saved with `save_network`.
+
+    Nodes, edges and their weights are the same as in the saved network, but
+    order of neighbours in undirected layers can differ.
+
+    :param path: a directory with the saved network
+    :param mmap: a flag whether to memory-map arrays instead of reading them
+    """
+    with open(os.path.join(path, "meta.json"), encoding="utf-8") as file:
+        meta = json.load(file)
+    snaps = []
+    for snap_meta, snap_layers in zip(meta["snaps"], load_csr_layers(path, mmap)):
+        layers = {
+            l_meta["name"]: _csr_to_layer(*snap_layers[l_meta["name"]], l_meta["directed"], l_meta["weighted"])
+            for l_meta in snap_meta
+        }
+        snaps.append(nd.MultilayerNetwork(layers))
+    return nd.TemporalNetwork(snaps) if meta["temporal"] else snaps[0]
+
+
+def _file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(2 ** 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def get_cache_path(builder: Callable, source_path: str, cache_dir: str, **params: Any) -> str:
+    """Get a path of the cache entry keyed by source file and parameters."""
+    key = json.dumps({"builder": builder.__qualname__, "params": params}, sort_keys=True, default=str)
+    key_hash = hashlib.sha256(key.encode()).hexdigest()[:16]
+    return os.path.join(cache_dir, f"{builder.__name__}-{_file_hash(source_path)[:16]}-{key_hash}")
+
+
+def cached_network(
+    builder: Callable[..., Union[nd.MultilayerNetwork, nd.TemporalNetwork]],
+    source_path: str,
+    cache_dir: str,
+    **params: Any,
+) -> Union[nd.MultilayerNetwork, nd.TemporalNetwork]:
+    """
+    Load the network from the cache or build it with `builder` and save it.
+
+    :param builder: a function that builds the network from `params`
+    :param source_path: a path to the file the network is built from, a hash
+        of its content is a part of the cache key
+    :param cache_dir: a directory with cached networks
+    :param params: parameters of `builder`, also a part of the cache key
+    """
+    path = get_cache_path(builder, source_path, cache_dir, **params)
+    if os.path.exists(os.path.join(path, "meta.json")):
+        return load_network(path)
+    net = builder(**params)
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    save_network(net, tmp_path)
+    try:
+        os.replace(tmp_path, path)
+    except OSError as error:
+        # another process has saved the same network in the meantime
+        if error.errno not in (errno.ENOTEMPTY, errno.EEXIST) or not os.path.isdir(path):
+            raise
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        return load_network(path)
+    return net
+
+
+class _SharedTopology:
+    """
+    Mixin of a graph which shares its adjacency with another graph.
+
+    Attributes of nodes (e.g. states set by models) are private to the graph,
+    while the adjacency (including attributes of edges) is read from the
+    original graph until the topology is modified for the first time. Hence
+    attributes of edges are read-only as long as the adjacency is shared,
+    writing them (e.g. `graph[u][v]["weight"] = 1`) changes the original.
+    """
+
+    _owns_topology = True
+
+    # views of the adjacency cached by networkx, they hold the shared dicts
+    _ADJACENCY_VIEWS = (
+        "adj", "succ", "pred", "edges", "out_edges", "in_edges", "degree", "in_degree", "out_degree"
+    )
+
+    def _own_topology(self) -> None:
+        """Copy the adjacency before it is modified."""
+        if self._owns_topology:
+            return
+        if self.is_directed():
+            self._succ, self._pred = copy.deepcopy((self._succ, self._pred))
+            self._adj = self._succ
+        else:
+            self._adj = copy.deepcopy(self._adj)
+        for name in self._ADJACENCY_VIEWS:
+            self.__dict__.pop(name, None)
+        self._owns_topology = True
+
+
+def _copy_on_write(method_name: str) -> Callable:
+    def method(self, *args, **kwargs):
+        self._own_topology()
+        return getattr(super(_SharedTopology, self), method_name)(*args, **kwargs)
+
+    method.__name__ = method_name
+    return method
+
+
+for _method_name in (
+    "add_node",
+    "add_nodes_from",
+    "remove_node",
+    "remove_nodes_from",
+    "add_edge",
+    "add_edges_from",
+    "add_weighted_edges_from",
+    "remove_edge",
+    "remove_edges_from",
+    "update",
+    "clear",
+    "clear_edges",
+):
+    setattr(_SharedTopology, _method_name, _copy_on_write(_method_name))
+
+
+class SharedGraph(_SharedTopology, nx.Graph):
+    pass
+
+
+class SharedDiGraph(_SharedTopology, nx.DiGraph):
+    pass
+
+
+def share_topology(graph: nx.Graph) -> nx.Graph:
+    """
+    Create a copy of the graph that shares its adjacency with the original.
+
+    The copy costs O(number of nodes) instead of O(number of edges). The
+    original graph must not be modified as long as its copies are in use, and
+    attributes of edges of the copy are read-only until its topology is
+    modified (adding or removing nodes or edges copies the adjacency), since
+    they are shared with the original. Multigraphs are deep-copied.
+
+    :param graph: a graph to copy
+    :return: a graph with own attributes of nodes and a shared adjacency
+    """
+    if graph.is_multigraph():
+        return copy.deepcopy(graph)
+    shared = SharedDiGraph() if graph.is_directed() else SharedGraph()
+    shared.graph = copy.deepcopy(graph.graph)
+    shared._node = {node: attrs.copy() for node, attrs in graph._node.items()}
+    if graph.is_directed():
+        shared._succ, shared._pred = graph._succ, graph._pred
+        shared._adj = shared._succ
+    else:
+        shared._adj = graph._adj
+    shared._owns_topology = False
+    return shared
+
+
+class CopyOnWriteNetwork(nd.MultilayerNetwork):
+    """Multilayer network which shares topology of layers with another one."""
+
+    def __init__(self, network: nd.MultilayerNetwork) -> None:
+        """
+        Create a lightweight copy of the network.
+
+        Only states of nodes are materialised per copy, hence copies can be
+        created for each repetition of the experiment instead of deep copies.
+        Note that statuses of nodes are reset, as in `nd.MultilayerNetwork`,
+        and that attributes of edges are shared, see `share_topology`.
+
+        :param network: a network to share the topology with
+        """
+        super().__init__({l_name: share_topology(l_graph) for l_name, l_graph in network.layers.items()})
+
+    def copy(self) -> "CopyOnWriteNetwork":
+        """Create a copy that shares the topology with this network."""
+        return CopyOnWriteNetwork(self)
+
+
+class StaticTemporalNetwork(nd.TemporalNetwork):
+    """Temporal view of a static network, i.e. the same snapshot N times."""
+
+    def __init__(self, network: nd.MultilayerNetwork, n_snaps: int) -> None:
+        """
+        Create the view.
+
+        It is an equivalent of `nd.TemporalNetwork.from_nx_layers(n_snaps *
+        [graph])` which neither creates nor resets states of N snapshots.
+
+        :param network: a snapshot to present in each epoch
+        :param n_snaps: number of snapshots
+        """
+        super().__init__([network] * n_snaps)
+
+    @classmethod
+    def from_nx_layer(
+        cls, graph: nx.Graph, n_snaps: int, layer_name: str = "layer_1"
+    ) -> "StaticTemporalNetwork":
+        """
+        Create the view of a single-layer network.
+
+        :param graph: a graph to present in each epoch
+        :param n_snaps: number of snapshots
+        :param layer_name: name of the layer, by default the same as in
+            networks created by `nd.TemporalNetwork`
+        """
+        return cls(nd.MultilayerNetwork({layer_name: graph}), n_snaps)
+
+    def copy(self) -> "StaticTemporalNetwork":
+        """Create a view with own states of nodes and a shared topology."""
+        return StaticTemporalNetwork(CopyOnWriteNetwork(self.snaps[0]), len(self.snaps))
+
+
+if __name__ == "__main__":
+    # a copy of a graph sees its own edges once it is modified, also through
+    # views read before the modification, and the original stays intact
+    for original in (nx.path_graph(4), nx.path_graph(4, create_using=nx.DiGraph)):
+        shared = share_topology(original)
+        # read views, so that networkx caches them
+        _ = [*shared.edges()], dict(shared.degree()), {**shared.adj}
+        shared.add_edge(0, 3)
+        assert len([*shared.edges()]) == shared.number_of_edges() == 4
+        assert dict(shared.degree())[0] == 2
+        assert shared.has_edge(0, 3) and 3 in shared.adj[0]
+        assert original.number_of_edges() == len([*original.edges()]) == 3 and not original.has_edge(0, 3)
+    print("shared topology checks passed")
@@ -0,0 +1,108 @@
+"""
+Plotting helpers of experiments.
+
+They live apart from `functions` and `time_measurements`, which are imported by
+worker processes, so that matplotlib is imported only where results are
+plotted. Both modules still expose these functions under their old names.
+"""
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+
+
+def visualize_results_as_heatmap(results_df, index, columns, values, title, normalize=True, colorbar_label=None,
+                                 x_label=None, y_label=None):
+    methods = sorted(results_df['method'].unique())
+    fig, axes = plt.subplots(1, len(methods), figsize=(12, 6))
+    fig.suptitle(title, fontsize=16)
+
+    if normalize:
+        agents_sum = sum([results_df[c][0] for c in results_df.columns if c.startswith('start_')])
+        for c in results_df.columns:
+            if c.startswith('start_') or c.startswith('final_'):
+                results_df[c] = results_df[c]/agents_sum
+
+    vmin = results_df[values].min()
+    vmax = results_df[values].max()
+
+    for i, method in enumerate(methods):
+        ax = axes[i]
+        df = results_df[results_df['method'] == method]
+        pivot_df = df.pivot_table(index=index, columns=columns, values=values)
+
+        # Convert the pivot table data to a NumPy array
+        heatmap_data = pivot_df.to_numpy()
+
+        # Define the x and y labels
+        x_labels = pivot_df.columns
+        y_labels = pivot_df.index
+
+        # Create a heatmap using pure matplotlib
+        im = ax.imshow(heatmap_data, cmap='coolwarm', interpolation='nearest', vmin=vmin, vmax=vmax)
+
+        # Set the x and y labels
+        ax.set_xticks(np.arange(len(x_labels)))
+        ax.set_yticks(np.arange(len(y_labels)))
+        ax.set_xticklabels(x_labels)
+        ax.set_yticklabels(y_labels)
+
+        # Display the colorbar
+        cbar = fig.colorbar(im, ax=ax)
+        label = colorbar_label if colorbar_label else values
+        cbar.set_label(label)
+
+        for j in range(len(y_labels)):
+            for k in range(len(x_labels)):
+                ax.text(k, j, "{:.2f}".format(heatmap_data[j, k]), ha='center', va='center', color='black')
+
+        # Set labels for the x and y axes
+        x_label = x_label if x_label else columns
+        ax.set_xlabel(x_label)
+        y_label = y_label if y_label else index
+        ax.set_ylabel(y_label)
+        ax.set_title(method)
+
+    plt.tight_layout(rect=[0, 0, 1, 0.92])
+    # Show the heatmap
+    plt.show()
+
+
+def compare_nets(n1, n2):
+    n1_layer_name = list(n1.snaps[0].layers.keys())[0]
+    n2_layer_name = list(n2.snaps[0].layers.keys())[0]
+    n1_edges_no = []
+    n2_edges_no = []
+    snapshots = list(zip(n1.snaps, n2.snaps))
+    for s1, s2 in snapshots:
+        n1_edges_no.append(len(s1[n1_layer_name].edges))
+        n2_edges_no.append(len(s2[n2_layer_name].edges))
+    x = list(range(0, len(snapshots)))
+    plt.plot(x, n1_edges_no)
+    plt.plot(x, n2_edges_no)
+    plt.show()
+
+
+def plot_time_efficiency(
+        data: pd.DataFrame, data_name: str, axes: plt.Axes
+) -> None:
+    """
+    Produce plot for measurement.
+
+    The resulting plot is a curve of mean time for each sample bounded by its
+    standard deviation.
+
+    :param data: a dataframe with measurements (opuput of "time_complexity")
+    :param data_name: name of the data
+    :param axes: canvas to plot curves on
+    """
+
+    x = data.index.to_numpy()
+    y = data.apply(lambda row: np.mean(row), axis=1).to_numpy()
+    y_std = data.apply(lambda row: np.std(row), axis=1).to_numpy()
+
+    axes.plot(
+        x, y, '-o',
+        label=f"'{data_name}'",
+        alpha=0.9
+    )
+    axes.fill_between(x, y-y_std, y+y_std, alpha=0.2)
@@ -0,0 +1,263 @@
+"""
+Instrumentation of simulations to find out where their time goes.
+
+Methods of models, seed selectors and loggers are wrapped only within
+`Profiler.instrument` contexts, so code which is not profiled runs without any
+overhead. Each call of a wrapped method is recorded as a phase with its wall
+time, position in the stack of phases, run and epoch of the simulation and
+(optionally) memory allocated in it.
+"""
+import functools
+import json
+import os
+import time
+import tracemalloc
+
+from contextlib import ExitStack, contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Union
+
+import network_diffusion as nd
+import pandas as pd
+
+
+MODEL_METHODS = ("determine_initial_states", "network_evaluation_step", "update_network", "get_states_num")
+DETAILED_MODEL_METHODS = ("agent_evaluation_step", "get_possible_transitions")
+SELECTOR_METHODS = ("actorwise", "nodewise")
+LOGGER_METHODS = ("add_global_stat", "add_local_stat", "convert_logs")
+NETWORK_METHODS = ("_get_description_str",)
+
+
+class Profiler:
+    """Recorder of phases of simulations."""
+
+    # calls of these phases start a new run and a new epoch, respectively
+    RUN_PHASE = "determine_initial_states"
+    EPOCH_PHASE = "network_evaluation_step"
+
+    def __init__(self, track_memory: bool = False) -> None:
+        """
+        Create the profiler.
+
+        :param track_memory: a flag whether to record memory allocated in each
+            phase with `tracemalloc` (it slows down the code considerably)
+        """
+        self.track_memory = track_memory
+        self.events: List[Dict[str, Any]] = []
+        self._stack: List[str] = []
+        self._children_ns: List[int] = []
+        self._origin = time.perf_counter_ns()
+        self._run = -1
+        self._epoch = 0
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Record the code executed within the context as a phase."""
+        if name == self.RUN_PHASE:
+            self._run, self._epoch = self._run + 1, 0
+        elif name == self.EPOCH_PHASE:
+            self._epoch += 1
+        run, epoch = self._run, self._epoch
+
+        self._stack.append(name)
+        self._children_ns.append(0)
+        memory_start = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else None
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter_ns() - start
+            children_ns = self._children_ns.pop()
+            if self._children_ns:
+                self._children_ns[-1] += duration
+            self.events.append({
+                "name": name,
+                "stack": ";".join(self._stack),
+                "depth": len(self._stack) - 1,
+                "run": run,
+                "epoch": epoch,
+                "start_ns": start - self._origin,
+                "duration_ns": duration,
+                "self_ns": duration - children_ns,
+                "allocated_bytes": (
+                    tracemalloc.get_traced_memory()[0] - memory_start if memory_start is not None else None
+                ),
+            })
+            self._stack.pop()
+
+    def wrap(self, function: Callable, name: Optional[str] = None) -> Callable:
+        """
+        Wrap the function so that each its call is recorded as a phase.
+
+        It can be used as a decorator as well, e.g. `@profiler.wrap`.
+        """
+        name = name or function.__name__
+
+        @functools.wraps(function)
+        def wrapped(*args, **kwargs):
+            with self.phase(name):
+                return function(*args, **kwargs)
+
+        return wrapped
+
+    @contextmanager
+    def instrument(self, target: Any, methods: Sequence[str]) -> Iterator[None]:
+        """
+        Wrap methods of the object or the class within the context.
+
+        :param target: an instance or a class to wrap methods of
+        :param methods: names of methods, missing ones are skipped
+        """
+        originals = {}
+        for name in methods:
+            if not hasattr(target, name):
+                continue
+            originals[name] = (name in vars(target), vars(target).get(name))
+            setattr(target, name, self.wrap(getattr(target, name), name))
+        try:
+            yield
+        finally:
+            for name, (was_own, original) in originals.items():
+                if was_own:
+                    setattr(target, name, original)
+                else:
+                    delattr(target, name)
+
+    @contextmanager
+    def _trace_memory(self) -> Iterator[None]:
+        """Start tracing allocations within the context if needed."""
+        if not self.track_memory or tracemalloc.is_tracing():
+            yield
+            return
+        tracemalloc.start()
+        try:
+            yield
+        finally:
+            tracemalloc.stop()
+
+    @contextmanager
+    def instrument_model(self, model: nd.models.BaseModel, detailed: bool = False) -> Iterator[None]:
+        """
+        Instrument the model, its seed selector and logging within the context.
+
+        Logging consists of methods of `nd.Logger` and of creating a
+        description of the network (`nd.MultilayerNetwork.__str__`).
+
+        :param model: a model to instrument
+        :param detailed: a flag whether to wrap also methods called for each
+            node (e.g. `agent_evaluation_step`), which adds a noticeable overhead
+        """
+        with ExitStack() as stack:
+            stack.enter_context(self._trace_memory())
+            methods = (*MODEL_METHODS, *DETAILED_MODEL_METHODS) if detailed else MODEL_METHODS
+            stack.enter_context(self.instrument(model, methods))
+            stack.enter_context(self.instrument(model._seed_selector, SELECTOR_METHODS))
+            stack.enter_context(self.instrument(nd.Logger, LOGGER_METHODS))
+            stack.enter_context(self.instrument(nd.MultilayerNetwork, NETWORK_METHODS))
+            yield
+
+    def profile_simulation(
+        self,
+        model: Union[nd.models.BaseModel, Callable[[], nd.models.BaseModel]],
+        network: Union[nd.MultilayerNetwork, nd.TemporalNetwork],
+        n_epochs: int,
+        patience: Optional[int] = None,
+        repetitions: int = 1,
+        simulator: Callable = nd.Simulator,
+        detailed: bool = False,
+    ) -> "Profiler":
+        """
+        Run the simulation with instrumented model and record its phases.
+
+        :param model: a model or its factory (e.g. `models.get_sirua`), in the
+            latter case creation of the model is recorded as a "setup" phase
+        :param network: a network to run the simulation on
+        :param n_epochs: number of epochs
+        :param patience: see `nd.Simulator.perform_propagation`
+        :param repetitions: number of runs
+        :param simulator: a class to run the model with
+        :param detailed: see `instrument_model`
+        :return: the profiler
+        """
+        with self._trace_memory():
+            for _ in range(repetitions):
+                self._profile_run(model, network, n_epochs, patience, simulator, detailed)
+        return self
+
+    def _profile_run(
+        self,
+        model: Union[nd.models.BaseModel, Callable[[], nd.models.BaseModel]],
+        network: Union[nd.MultilayerNetwork, nd.TemporalNetwork],
+        n_epochs: int,
+        patience: Optional[int],
+        simulator: Callable,
+        detailed: bool,
+    ) -> None:
+        if isinstance(model, nd.models.BaseModel):
+            run_model = model
+        else:
+            with self.phase(f"setup:{getattr(model, '__name__', 'model')}"):
+                run_model = model()
+        with self.instrument_model(run_model, detailed):
+            with self.phase("perform_propagation"):
+                simulator(run_model, network).perform_propagation(n_epochs=n_epochs, patience=patience)
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """Return recorded phases, one per row, with durations in ms."""
+        events = pd.DataFrame(self.events)
+        if len(events):
+            events["duration_ms"] = events["duration_ns"] / 1e6
+            events["self_ms"] = events["self_ns"] / 1e6
+        return events
+
+    def summary(self) -> pd.DataFrame:
+        """Return number of calls, total and self times and allocations of phases."""
+        events = self.to_dataframe()
+        return events.groupby("name").agg(
+            calls=("duration_ms", "size"),
+            total_ms=("duration_ms", "sum"),
+            self_ms=("self_ms", "sum"),
+            mean_ms=("duration_ms", "mean"),
+            allocated_mb=("allocated_bytes", lambda values: values.sum(min_count=1) / 2 ** 20),
+        ).sort_values("total_ms", ascending=False)
+
+    def epoch_frame(self, name: str = EPOCH_PHASE) -> pd.DataFrame:
+        """
+        Return times of the phase per epoch.
+
+        :param name: name of the phase
+        :return: a dataframe with epochs in index and runs in columns (times in
+            ms), in the layout of `time_measurements.time_complexity` output,
+            so that it can be passed to `plotting.plot_time_efficiency`
+        """
+        events = self.to_dataframe()
+        events = events[events["name"] == name]
+        frame = events.pivot_table(index="epoch", columns="run", values="duration_ms", aggfunc="sum")
+        frame.columns = [f"run_{run}" for run in frame.columns]
+        return frame
+
+    def to_chrome_trace(self, path: str) -> None:
+        """Save phases in the Trace Event Format (chrome://tracing, Perfetto, speedscope)."""
+        trace_events = [
+            {
+                "name": event["name"],
+                "cat": "phase",
+                "ph": "X",
+                "ts": event["start_ns"] / 1e3,
+                "dur": event["duration_ns"] / 1e3,
+                "pid": os.getpid(),
+                "tid": 0,
+                "args": {key: event[key] for key in ("run", "epoch", "allocated_bytes")},
+            }
+            for event in self.events
+        ]
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump({"traceEvents": trace_events, "displayTimeUnit": "ms"}, file)
+
+    def to_collapsed_stacks(self, path: str) -> None:
+        """Save self times (in us) of stacks of phases in the format of flamegraph.pl."""
+        self_times: Dict[str, int] = {}
+        for event in self.events:
+            self_times[event["stack"]] = self_times.get(event["stack"], 0) + event["self_ns"]
+        with open(path, "w", encoding="utf-8") as file:
+            for stack, self_ns in self_times.items():
+                file.write(f"{stack} {self_ns // 1000}\n")
@@ -0,0 +1,120 @@
+"""
+Parallel runner of repeated (Monte Carlo) simulations.
+
+A network is shipped to each worker process once, when the worker starts, and
+tasks carry only a seed of the repetition. Since seeds are derived per
+repetition (not per worker) results do not depend on the number of workers nor
+on the order in which tasks are scheduled.
+"""
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Union
+
+import network_diffusion as nd
+import numpy as np
+
+from tqdm import tqdm
+
+from utils import functions
+
+
+_WORKER: Dict[str, Any] = {}
+
+
+def get_repetition_seeds(n_repetitions: int, seed: Optional[int] = None) -> List[int]:
+    """
+    Derive independent seeds for repetitions of the experiment.
+
+    :param n_repetitions: number of seeds to create
+    :param seed: a root seed; if not provided it is drawn from the global NumPy
+        state, so that it is determined by `functions.set_seed`
+    :return: list of seeds, one per repetition
+    """
+    if seed is None:
+        seed = np.random.randint(0, 2 ** 32 - 1)
+    children = np.random.SeedSequence(seed).spawn(n_repetitions)
+    return [int(child.generate_state(1)[0]) for child in children]
+
+
+def _init_worker(
+    model_factory: Callable[[], nd.models.BaseModel],
+    network: Union[nd.MultilayerNetwork, nd.TemporalNetwork],
+    n_epochs: int,
+    patience: Optional[int],
+    simulator: Callable,
+    result_fn: Optional[Callable[[nd.Logger], Any]],
+    copy_network: bool,
+) -> None:
+    _WORKER.update(
+        model_factory=model_factory,
+        network=network,
+        n_epochs=n_epochs,
+        patience=patience,
+        simulator=simulator,
+        result_fn=result_fn,
+        copy_network=copy_network,
+    )
+
+
+def _run_repetition(seed: int) -> Any:
+    functions.set_seed(seed)
+    model = _WORKER["model_factory"]()
+    network = _WORKER["network"].copy() if _WORKER["copy_network"] else _WORKER["network"]
+    experiment = _WORKER["simulator"](model, network)
+    logs = experiment.perform_propagation(n_epochs=_WORKER["n_epochs"], patience=_WORKER["patience"])
+    if _WORKER["result_fn"] is not None:
+        return _WORKER["result_fn"](logs)
+    return logs
+
+
+def run_repetitions(
+    model_factory: Callable[[], nd.models.BaseModel],
+    network: Union[nd.MultilayerNetwork, nd.TemporalNetwork],
+    n_repetitions: int,
+    n_epochs: int,
+    patience: Optional[int] = None,
+    seed: Optional[int] = None,
+    max_workers: Optional[int] = None,
+    simulator: Callable = nd.Simulator,
+    result_fn: Optional[Callable[[nd.Logger], Any]] = None,
+    copy_network: bool = False,
+) -> List[Any]:
+    """
+    Run repetitions of the simulation in a pool of processes.
+
+    Before each repetition global random states are set with
+    `functions.set_seed` to the seed of that repetition, hence results are
+    reproducible bit-for-bit. Note that on platforms which do not fork
+    processes `model_factory`, `simulator` and `result_fn` must be picklable
+    (e.g. module-level functions or `functools.partial` objects).
+
+    :param model_factory: a function that creates a model for a repetition
+    :param network: a network to run the simulations on
+    :param n_repetitions: number of repetitions
+    :param n_epochs: number of epochs of each simulation
+    :param patience: see `nd.Simulator.perform_propagation`
+    :param seed: a root seed to derive seeds of repetitions from; if not
+        provided it is drawn from the global NumPy state
+    :param max_workers: number of processes; if 1, repetitions are performed
+        in the current process
+    :param simulator: a class with `perform_propagation` method to run the
+        model with, e.g. `nd.Simulator` or `engines.SIR_UAEngine`
+    :param result_fn: a function to reduce logs of the repetition in the
+        worker, so that only its output is sent back (e.g. `lambda logs:
+        logs._global_stats_converted`)
+    :param copy_network: a flag whether to run each repetition on a copy of
+        the network instead of the instance held by the worker
+    :return: results of repetitions in order of their seeds
+    """
+    seeds = get_repetition_seeds(n_repetitions, seed)
+    init_args = (model_factory, network, n_epochs, patience, simulator, result_fn, copy_network)
+
+    if max_workers == 1:
+        _init_worker(*init_args)
+        return [_run_repetition(s) for s in tqdm(seeds)]
+
+    max_workers = max_workers or os.cpu_count() or 1
+    chunksize = max(1, n_repetitions // (4 * max_workers))
+    with ProcessPoolExecutor(max_workers, initializer=_init_worker, initargs=init_args) as executor:
+        return list(tqdm(executor.map(_run_repetition, seeds, chunksize=chunksize), total=n_repetitions))
@@ -0,0 +1,136 @@
+"""Auxiliary seed selectors to speed up experiments with many repetitions."""
+import hashlib
+import os
+import pickle
+import weakref
+
+from typing import Any, Dict, List, Optional, Tuple
+
+import networkx as nx
+import network_diffusion as nd
+
+
+def network_fingerprint(net: nd.MultilayerNetwork) -> str:
+    """
+    Compute a structural fingerprint of the network.
+
+    It depends on names and types of layers and on sets of nodes and edges in
+    them, but not on attributes of nodes (e.g. states set by the simulator).
+
+    :param net: a network to compute the fingerprint for
+    :return: a hex digest of the fingerprint
+    """
+    digest = hashlib.sha256()
+    for l_name in sorted(net.layers, key=repr):
+        l_graph = net.layers[l_name]
+        nodes = sorted(repr(node) for node in l_graph.nodes())
+        if l_graph.is_directed():
+            edges = sorted(f"{u!r}>{v!r}" for u, v in l_graph.edges())
+        else:
+            edges = sorted("-".join(sorted((repr(u), repr(v)))) for u, v in l_graph.edges())
+        digest.update(f"{l_name!r}|{l_graph.is_directed()}|".encode())
+        digest.update("\n".join(nodes).encode())
+        digest.update(b"|")
+        digest.update("\n".join(edges).encode())
+        digest.update(b"#")
+    return digest.hexdigest()
+
+
+class CachedSelector(nd.seeding.base_selector.BaseSeedSelector):
+    """Seed selector that memoizes rankings computed by a wrapped selector."""
+
+    def __init__(self, selector: nd.seeding.base_selector.BaseSeedSelector, cache_dir: Optional[str] = None) -> None:
+        """
+        Wrap the selector.
+
+        Rankings are keyed by the structural fingerprint of the network, hence
+        wrap only deterministic selectors (e.g. not `RandomSeedSelector`).
+
+        :param selector: a selector to compute rankings with
+        :param cache_dir: if provided, rankings are also stored in this
+            directory and reused across sessions
+        """
+        super().__init__()
+        self.selector = selector
+        self.cache_dir = cache_dir
+        self._cache: Dict[str, Any] = {}
+        self._fingerprints: Dict[int, Tuple[weakref.ref, Tuple[Any, ...], str]] = {}
+
+    def __str__(self) -> str:
+        """Return seed method's description."""
+        return str(self.selector)
+
+    def _calculate_ranking_list(self, graph: nx.Graph) -> List[Any]:
+        """Create a ranking of nodes in the single layer graph with the wrapped selector."""
+        return self.selector._calculate_ranking_list(graph)
+
+    @staticmethod
+    def _get_shape(net: nd.MultilayerNetwork) -> Tuple[Any, ...]:
+        """Get a cheap summary of the network which changes with most modifications of its topology."""
+        return tuple(
+            (l_name, id(l_graph), id(l_graph._adj), l_graph.number_of_nodes(), l_graph.number_of_edges())
+            for l_name, l_graph in net.layers.items()
+        )
+
+    def set_fingerprint(self, net: nd.MultilayerNetwork, fingerprint: Optional[str] = None) -> None:
+        """
+        Store a fingerprint of the network to key its rankings with.
+
+        Fingerprints are memoised per network object and recomputed only if
+        the summary of its layers (graphs, numbers of nodes and edges) changes.
+        Call this method after modifying the network in place in a way which
+        keeps that summary (e.g. rewiring edges), or to pass a precomputed
+        fingerprint of the network.
+
+        :param net: a network to store the fingerprint for
+        :param fingerprint: a precomputed fingerprint, if not provided it is
+            computed with `network_fingerprint`
+        """
+        if fingerprint is None:
+            fingerprint = network_fingerprint(net)
+        self._fingerprints[id(net)] = (weakref.ref(net), self._get_shape(net), fingerprint)
+
+    def _get_fingerprint(self, net: nd.MultilayerNetwork) -> str:
+        entry = self._fingerprints.get(id(net))
+        if entry is None or entry[0]() is not net or entry[1] != self._get_shape(net):
+            self.set_fingerprint(net)
+            entry = self._fingerprints[id(net)]
+        return entry[2]
+
+    def _get_key(self, net: nd.MultilayerNetwork, mode: str) -> str:
+        method = hashlib.sha256(f"{type(self.selector).__name__}:{self.selector}".encode()).hexdigest()
+        return f"{mode}-{method[:16]}-{self._get_fingerprint(net)[:32]}"
+
+    def _get_ranking(self, net: nd.MultilayerNetwork, mode: str) -> Any:
+        """Read the ranking from the cache or compute and store it."""
+        key = self._get_key(net, mode)
+        if key in self._cache:
+            return self._cache[key]
+
+        path = os.path.join(self.cache_dir, f"{key}.pickle") if self.cache_dir else None
+        if path and os.path.exists(path):
+            with open(path, "rb") as file:
+                ranking = pickle.load(file)
+        else:
+            if mode == "actorwise":
+                ranking = [actor.actor_id for actor in self.selector.actorwise(net)]
+            else:
+                ranking = self.selector.nodewise(net)
+            if path:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                tmp_path = f"{path}.tmp{os.getpid()}"
+                with open(tmp_path, "wb") as file:
+                    pickle.dump(ranking, file)
+                os.replace(tmp_path, path)
+
+        self._cache[key] = ranking
+        return ranking
+
+    def nodewise(self, net: nd.MultilayerNetwork) -> Dict[str, List[Any]]:
+        """Create nodewise ranking or read it from the cache."""
+        return {l_name: [*ranking] for l_name, ranking in self._get_ranking(net, "nodewise").items()}
+
+    def actorwise(self, net: nd.MultilayerNetwork) -> List[nd.MLNetworkActor]:
+        """Create actorwise ranking or read it from the cache."""
+        actors = {actor.actor_id: actor for actor in net.get_actors()}
+        return [actors[actor_id] for actor_id in self._get_ranking(net, "actorwise")]
@@ -0,0 +1,502 @@
+"""
+Local service which runs sweeps of experiments in warm worker processes.
+
+The service keeps one pool of processes for its whole lifetime. Each worker
+loads shared data (e.g. networks) once, when it starts, so consecutive sweeps
+do not pay for starting a kernel and reading files again. Sweeps are submitted
+as grids of parameters (see `sweep.expand_grid`) with a name of a function
+registered in the service which performs one repetition in a cell, as
+`run_fn` of `sweep.run_sweep` does.
+
+An asyncio front end dispatches repetitions of pending cells to the pool,
+cells with a higher priority first, and keeps only a few of them queued in
+the pool, so cells can be cancelled or reprioritised while the sweep runs.
+After each repetition metrics of the cell computed so far are broadcast as a
+progress event, and finished cells are written to a `sweep.ResultStore`.
+
+Clients talk to the service over a local TCP socket with JSON lines: each
+request is a line with an object with "op" key, each response is a line with
+"ok" key. A response to "watch" is followed by a stream of events of the job,
+then the connection is closed.
+E.g. a script which serves experiments from `mltm_cogsnet.ipynb`::
+
+    def run_mltm(params, networks):
+        ...  # return {"Temporal": logs_1, "Static": logs_2}
+
+    service.serve({"mltm": run_mltm}, shared_factory=load_networks, port=8765)
+
+and a notebook which submits a sweep and follows it::
+
+    job = service.send({"op": "submit", "runner": "mltm", "grid": grid, "n_repetitions": 10})["job"]
+    for event in service.watch(job):
+        print(event)
+"""
+import asyncio
+import itertools
+import json
+import os
+import socket
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+from utils import functions
+from utils.sweep import (
+    METRIC_NAMES, ResultStore, expand_grid, get_cell_key, get_cell_seeds, get_global_stats, get_rows
+)
+
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+# statuses of cells, the last three are final
+PENDING, RUNNING, FINISHED, CANCELLED, FAILED = "pending", "running", "finished", "cancelled", "failed"
+
+_WORKER: Dict[str, Any] = {}
+
+
+def _init_worker(
+    runners: Dict[str, Callable[[Dict[str, Any], Any], Dict[str, Any]]], shared_factory: Optional[Callable[[], Any]]
+) -> None:
+    _WORKER.update(runners=runners, shared=shared_factory() if shared_factory is not None else None)
+
+
+def _run_repetition(runner: str, params: Dict[str, Any], seed: int) -> Dict[str, Any]:
+    functions.set_seed(seed)
+    return get_global_stats(_WORKER["runners"][runner](params, _WORKER["shared"]))
+
+
+class Cell:
+    """A cell of a submitted sweep with its pending repetitions and partial aggregates."""
+
+    def __init__(self, job: "Job", idx: int, params: Dict[str, Any], seeds: List[int]) -> None:
+        self.job = job
+        self.idx = idx
+        self.params = params
+        self.seeds = seeds
+        self.priority = job.priority
+        self.status = PENDING
+        self.next_seed = 0
+        self.in_flight = 0
+        self.done = 0
+        self.accumulators: Dict[str, functions.LogsAccumulator] = {}
+        self.error: Optional[str] = None
+
+    @property
+    def is_final(self) -> bool:
+        return self.status in (FINISHED, CANCELLED, FAILED)
+
+    @property
+    def has_pending(self) -> bool:
+        return self.status in (PENDING, RUNNING) and self.next_seed < len(self.seeds)
+
+    def get_rows(self) -> List[Dict[str, Any]]:
+        """Return metrics computed so far, see `sweep.get_rows`."""
+        return get_rows(self.accumulators, self.job.metric_names) if self.done else []
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "cell": self.idx,
+            "params": self.params,
+            "status": self.status,
+            "priority": self.priority,
+            "done": self.done,
+            "total": len(self.seeds),
+            "error": self.error,
+        }
+
+
+class Job:
+    """A submitted sweep."""
+
+    def __init__(
+        self,
+        job_id: int,
+        runner: str,
+        grid: Dict[str, Sequence[Any]],
+        n_repetitions: int,
+        store: Optional[ResultStore],
+        seed: int,
+        metric_names: Sequence[str],
+        priority: int,
+    ) -> None:
+        self.id = job_id
+        self.runner = runner
+        self.store = store
+        self.seed = seed
+        self.metric_names = metric_names
+        self.priority = priority
+        self.params = expand_grid(grid)
+        completed = set(store.completed()) if store is not None else set()
+        self.cells = [
+            Cell(self, idx, params, get_cell_seeds(params, n_repetitions, seed))
+            for idx, params in enumerate(self.params)
+        ]
+        for cell in self.cells:
+            if get_cell_key(cell.params) in completed:
+                cell.status = FINISHED
+                cell.done = len(cell.seeds)
+        self.finished = asyncio.Event()
+
+    @property
+    def is_final(self) -> bool:
+        return all(cell.is_final for cell in self.cells)
+
+    def to_dict(self) -> Dict[str, Any]:
+        statuses = [cell.status for cell in self.cells]
+        return {
+            "job": self.id,
+            "runner": self.runner,
+            "seed": self.seed,
+            "priority": self.priority,
+            "cells": {status: statuses.count(status) for status in (PENDING, RUNNING, FINISHED, CANCELLED, FAILED)},
+            "done": sum(cell.done for cell in self.cells),
+            "total": sum(len(cell.seeds) for cell in self.cells),
+        }
+
+    def get_results(self) -> List[Dict[str, Any]]:
+        """Return records of cells in order of the grid, finished ones from the store if there is one."""
+        if self.store is not None:
+            return self.store.to_dataframe(self.params).to_dict("records")
+        return [{**cell.params, **row} for cell in self.cells if cell.status == FINISHED for row in cell.get_rows()]
+
+
+class ExperimentService:
+    """Scheduler of repetitions of submitted sweeps on a pool of warm processes."""
+
+    def __init__(
+        self,
+        runners: Dict[str, Callable[[Dict[str, Any], Any], Dict[str, Any]]],
+        shared_factory: Optional[Callable[[], Any]] = None,
+        max_workers: Optional[int] = None,
+        queue_size: Optional[int] = None,
+    ) -> None:
+        """
+        Create the service, processes are started by `start`.
+
+        :param runners: functions which perform one repetition in a cell keyed
+            by names used in submitted sweeps, see `sweep.run_sweep`; on
+            platforms which do not fork processes they must be picklable
+        :param shared_factory: a function called once in each worker whose
+            output is passed to runners, e.g. a loader of networks
+        :param max_workers: number of processes
+        :param queue_size: maximal number of repetitions submitted to the pool
+            at once, by default twice the number of processes; the lower it
+            is, the sooner cancelling and reprioritising takes effect
+        """
+        self.runners = runners
+        self.shared_factory = shared_factory
+        self.max_workers = max_workers
+        self.queue_size = queue_size
+        self.jobs: Dict[int, Job] = {}
+        self._job_ids = itertools.count()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._in_flight = 0
+        self._subscribers: List[asyncio.Queue] = []
+
+    def start(self) -> None:
+        """Start the pool of processes, must be called within a running event loop."""
+        self._executor = ProcessPoolExecutor(
+            self.max_workers, initializer=_init_worker, initargs=(self.runners, self.shared_factory)
+        )
+        self.queue_size = self.queue_size or 2 * (self.max_workers or os.cpu_count() or 1)
+
+    def close(self) -> None:
+        """Cancel all jobs and stop the processes without waiting for running repetitions."""
+        for job in self.jobs.values():
+            self.cancel(job.id)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def subscribe(self) -> asyncio.Queue:
+        """Return a queue which receives all events from now on."""
+        queue: asyncio.Queue = asyncio.Queue()
+        self._subscribers.append(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        self._subscribers.remove(queue)
+
+    def _emit(self, event: Dict[str, Any]) -> None:
+        for queue in self._subscribers:
+            queue.put_nowait(event)
+
+    def _get_job(self, job_id: int) -> Job:
+        if job_id not in self.jobs:
+            raise KeyError(f"There is no job {job_id}!")
+        return self.jobs[job_id]
+
+    def _get_cells(self, job_id: int, cell_idx: Optional[int]) -> List[Cell]:
+        job = self._get_job(job_id)
+        if cell_idx is None:
+            return job.cells
+        if not 0 <= cell_idx < len(job.cells):
+            raise KeyError(f"There is no cell {cell_idx} in job {job_id}!")
+        return [job.cells[cell_idx]]
+
+    def submit(
+        self,
+        runner: str,
+        grid: Dict[str, Sequence[Any]],
+        n_repetitions: int,
+        store: Optional[str] = None,
+        seed: Optional[int] = None,
+        metric_names: Sequence[str] = METRIC_NAMES,
+        priority: int = 0,
+    ) -> int:
+        """
+        Submit a sweep, see `sweep.run_sweep` for meaning of arguments.
+
+        It must be called within the event loop the service was started in.
+
+        :param runner: a name of a registered function which performs one
+            repetition in a cell
+        :param store: if provided a path to a `sweep.ResultStore`, completed
+            cells found in it are skipped
+        :param priority: priority of cells of the sweep, higher goes first;
+            cells of equal priority are run in order of submission
+        :return: id of the job
+        """
+        if runner not in self.runners:
+            raise KeyError(f"There is no runner {runner}!")
+        if seed is None:
+            seed = np.random.randint(0, 2 ** 32 - 1)
+        job = Job(
+            next(self._job_ids),
+            runner,
+            grid,
+            n_repetitions,
+            ResultStore(store) if store is not None else None,
+            seed,
+            metric_names,
+            priority,
+        )
+        self.jobs[job.id] = job
+        self._emit({"event": "submitted", **job.to_dict()})
+        self._finish_job_if_final(job)
+        self._dispatch()
+        return job.id
+
+    def cancel(self, job_id: int, cell_idx: Optional[int] = None) -> None:
+        """
+        Cancel the cell or all cells of the job.
+
+        Pending repetitions are dropped, results of running ones are ignored.
+        """
+        for cell in self._get_cells(job_id, cell_idx):
+            if not cell.is_final:
+                cell.status = CANCELLED
+                cell.accumulators = {}
+                self._emit({"event": "cell", "job": job_id, **cell.to_dict()})
+        self._finish_job_if_final(self.jobs[job_id])
+
+    def prioritize(self, job_id: int, priority: int, cell_idx: Optional[int] = None) -> None:
+        """Set priority of the cell or of all cells of the job, higher goes first."""
+        for cell in self._get_cells(job_id, cell_idx):
+            cell.priority = priority
+
+    def status(self, job_id: Optional[int] = None) -> Dict[str, Any]:
+        """Return a summary of all jobs or details of the job with its cells."""
+        if job_id is None:
+            return {"jobs": [job.to_dict() for job in self.jobs.values()], "in_flight": self._in_flight}
+        job = self._get_job(job_id)
+        return {**job.to_dict(), "cell_details": [cell.to_dict() for cell in job.cells]}
+
+    async def wait(self, job_id: int) -> List[Dict[str, Any]]:
+        """Wait until the job is finished and return its results."""
+        job = self._get_job(job_id)
+        await job.finished.wait()
+        return job.get_results()
+
+    def _next_cell(self) -> Optional[Cell]:
+        """Get the cell whose repetition should be dispatched next."""
+        candidates = (cell for job in self.jobs.values() if not job.is_final for cell in job.cells if cell.has_pending)
+        return min(candidates, key=lambda cell: (-cell.priority, cell.job.id, cell.idx), default=None)
+
+    def _dispatch(self) -> None:
+        """Fill the pool with repetitions of cells with the highest priority."""
+        loop = asyncio.get_running_loop()
+        while self._executor is not None and self._in_flight < self.queue_size:
+            cell = self._next_cell()
+            if cell is None:
+                break
+            seed = cell.seeds[cell.next_seed]
+            cell.next_seed += 1
+            cell.in_flight += 1
+            if cell.status == PENDING:
+                cell.status = RUNNING
+                self._emit({"event": "cell", "job": cell.job.id, **cell.to_dict()})
+            self._in_flight += 1
+            future = loop.run_in_executor(self._executor, _run_repetition, cell.job.runner, cell.params, seed)
+            future.add_done_callback(lambda future, cell=cell: self._consume(cell, future))
+
+    def _consume(self, cell: Cell, future: asyncio.Future) -> None:
+        """Aggregate results of a finished repetition and dispatch next ones."""
+        self._in_flight -= 1
+        cell.in_flight -= 1
+        error = future.exception() if not future.cancelled() else None
+        if cell.is_final or future.cancelled():
+            self._dispatch()
+            return
+
+        if error is not None:
+            cell.status = FAILED
+            cell.error = repr(error)
+            cell.accumulators = {}
+            self._emit({"event": "cell", "job": cell.job.id, **cell.to_dict()})
+        else:
+            for method, logs in future.result().items():
+                cell.accumulators.setdefault(method, functions.LogsAccumulator()).add(logs)
+            cell.done += 1
+            if cell.done == len(cell.seeds):
+                cell.status = FINISHED
+                if cell.job.store is not None:
+                    cell.job.store.add(cell.params, cell.get_rows())
+            self._emit({"event": "progress", "job": cell.job.id, **cell.to_dict(), "rows": cell.get_rows()})
+        self._finish_job_if_final(cell.job)
+        self._dispatch()
+
+    def _finish_job_if_final(self, job: Job) -> None:
+        if job.is_final and not job.finished.is_set():
+            job.finished.set()
+            self._emit({"event": "finished", **job.to_dict()})
+
+    async def handle_request(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Perform an operation requested by a client.
+
+        Operations (with arguments): "submit" (as in `submit`), "cancel" (job,
+        cell), "prioritize" (job, priority, cell), "status" (job), "results"
+        (job) and "wait" (job).
+        """
+        request = {**request}
+        operation = request.pop("op", None)
+        if operation == "submit":
+            return {"job": self.submit(**request)}
+        if operation == "cancel":
+            self.cancel(request["job"], request.get("cell"))
+            return {}
+        if operation == "prioritize":
+            self.prioritize(request["job"], request["priority"], request.get("cell"))
+            return {}
+        if operation == "status":
+            return self.status(request.get("job"))
+        if operation == "results":
+            return {"results": self._get_job(request["job"]).get_results()}
+        if operation == "wait":
+            return {"results": await self.wait(request["job"])}
+        raise ValueError(f"Unknown operation {operation}!")
+
+    async def _watch(self, job_id: Optional[int], writer: asyncio.StreamWriter) -> None:
+        """Stream events of the job (or of all jobs) until it is finished."""
+        queue = self.subscribe()
+        try:
+            job = self.jobs.get(job_id) if job_id is not None else None
+            if job is not None:
+                # a snapshot of the current state, events emitted before are not repeated
+                for cell in job.cells:
+                    await _write_line(
+                        writer, {"event": "cell", "job": job.id, **cell.to_dict(), "rows": cell.get_rows()}
+                    )
+                if job.finished.is_set():
+                    await _write_line(writer, {"event": "finished", **job.to_dict()})
+                    return
+            while True:
+                event = await queue.get()
+                if job_id is None or event["job"] == job_id:
+                    await _write_line(writer, event)
+                    if event["event"] == "finished" and job_id is not None:
+                        return
+        finally:
+            self.unsubscribe(queue)
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while line := await reader.readline():
+                try:
+                    request = json.loads(line)
+                    if request.get("op") == "watch":
+                        if request.get("job") is not None:
+                            self._get_job(request["job"])
+                        await _write_line(writer, {"ok": True})
+                        await self._watch(request.get("job"), writer)
+                        break
+                    response = {"ok": True, **await self.handle_request(request)}
+                except Exception as error:  # the error is reported to the client, the service goes on
+                    response = {"ok": False, "error": repr(error)}
+                await _write_line(writer, response)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT) -> None:
+        """Start the processes and serve clients until the task is cancelled."""
+        self.start()
+        server = await asyncio.start_server(self._handle_connection, host, port)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.close()
+
+
+async def _write_line(writer: asyncio.StreamWriter, message: Dict[str, Any]) -> None:
+    writer.write(json.dumps(message, default=str).encode() + b"\n")
+    await writer.drain()
+
+
+def serve(
+    runners: Dict[str, Callable[[Dict[str, Any], Any], Dict[str, Any]]],
+    shared_factory: Optional[Callable[[], Any]] = None,
+    max_workers: Optional[int] = None,
+    host: str = DEFAULT_HOST,
+    port: int = DEFAULT_PORT,
+) -> None:
+    """Run the service until interrupted, see `ExperimentService` for arguments."""
+    try:
+        asyncio.run(ExperimentService(runners, shared_factory, max_workers).serve(host, port))
+    except KeyboardInterrupt:
+        pass
+
+
+def _open(host: str, port: int, request: Dict[str, Any]) -> socket.socket:
+    connection = socket.create_connection((host, port))
+    connection.sendall(json.dumps(request).encode() + b"\n")
+    return connection
+
+
+def send(request: Dict[str, Any], host: str = DEFAULT_HOST, port: int = DEFAULT_PORT) -> Dict[str, Any]:
+    """
+    Send a request to the service and return its response.
+
+    A blocking client, so it can be used in notebooks which already run an
+    event loop, e.g. `send({"op": "status"})`.
+    """
+    with _open(host, port, request) as connection, connection.makefile("rb") as lines:
+        response = json.loads(lines.readline())
+    if not response.pop("ok"):
+        raise RuntimeError(response["error"])
+    return response
+
+
+def watch(
+    job_id: Optional[int] = None, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT
+) -> Iterator[Dict[str, Any]]:
+    """
+    Follow events of the job as they come.
+
+    First states of all cells of the job are yielded, then "cell" (a change
+    of status), "progress" (with metrics of repetitions finished so far in
+    "rows") and a final "finished" event. Without the job id events of all
+    jobs are yielded until the connection is closed.
+    """
+    with _open(host, port, {"op": "watch", "job": job_id}) as connection, connection.makefile("rb") as lines:
+        response = json.loads(lines.readline())
+        if not response.pop("ok"):
+            raise RuntimeError(response["error"])
+        for line in lines:
+            yield json.loads(line)
@@ -0,0 +1,224 @@
+"""
+Resumable sweeps of experiments over a grid of parameters.
+
+Each cell of the grid (a combination of parameters) is repeated several times
+and repetitions of all pending cells are dispatched to a pool of processes.
+As soon as all repetitions of a cell are finished, its metrics are written in
+one transaction to an append-only SQLite store keyed by parameters of the cell,
+so a crashed sweep can be restarted and only missing cells are computed.
+"""
+import hashlib
+import itertools
+import json
+import os
+import sqlite3
+import time
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+import network_diffusion as nd
+import numpy as np
+import pandas as pd
+
+from tqdm import tqdm
+
+from utils import functions
+
+
+METRIC_NAMES = ("epochs", "start_A", "start_B", "final_A", "final_B")
+
+_WORKER: Dict[str, Any] = {}
+
+
+def expand_grid(grid: Dict[str, Sequence[Any]]) -> List[Dict[str, Any]]:
+    """
+    Expand the grid into a list of cells.
+
+    :param grid: values of each parameter, e.g. {"budget": [1, 5], "mi": [0.1]}
+    :return: all combinations of values, the last parameter changes fastest
+    """
+    names = [*grid.keys()]
+    return [dict(zip(names, values)) for values in itertools.product(*grid.values())]
+
+
+def get_cell_key(params: Dict[str, Any]) -> str:
+    """Get a key of the cell which does not depend on order of parameters."""
+    return json.dumps(params, sort_keys=True, default=str)
+
+
+class ResultStore:
+    """Append-only store of metrics of cells backed by an SQLite file."""
+
+    def __init__(self, path: str) -> None:
+        """
+        Open the store, create it if it does not exist.
+
+        :param path: path to the SQLite file
+        """
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        with self._connect() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS cells ("
+                "key TEXT PRIMARY KEY, params TEXT NOT NULL, rows TEXT NOT NULL, finished_at REAL NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=60)
+
+    def completed(self) -> List[str]:
+        """Return keys of cells stored so far."""
+        with self._connect() as connection:
+            return [key for key, in connection.execute("SELECT key FROM cells")]
+
+    def add(self, params: Dict[str, Any], rows: List[Dict[str, Any]]) -> None:
+        """
+        Store results of the cell, all rows are written in one transaction.
+
+        :param params: parameters of the cell
+        :param rows: records of results (e.g. one per method) to be extended
+            with values of parameters when read
+        """
+        with self._connect() as connection:
+            connection.execute(
+                "INSERT INTO cells (key, params, rows, finished_at) VALUES (?, ?, ?, ?)",
+                (get_cell_key(params), json.dumps(params, default=str), json.dumps(rows), time.time()),
+            )
+
+    def to_dataframe(self, cells: Optional[Iterable[Dict[str, Any]]] = None) -> pd.DataFrame:
+        """
+        Read results as a table, one record per row of each cell.
+
+        :param cells: if provided only these cells are read in given order,
+            otherwise all cells are read in order they were finished
+        :return: a dataframe with parameters of cells and their results in
+            columns, e.g. to be passed to `plotting.visualize_results_as_heatmap`
+        """
+        with self._connect() as connection:
+            stored = {
+                key: (json.loads(params), json.loads(rows))
+                for key, params, rows in connection.execute("SELECT key, params, rows FROM cells ORDER BY rowid")
+            }
+        keys = stored.keys() if cells is None else [get_cell_key(cell) for cell in cells]
+        records = [
+            {**stored[key][0], **row} for key in keys if key in stored for row in stored[key][1]
+        ]
+        return pd.DataFrame(records)
+
+
+def get_cell_seeds(params: Dict[str, Any], n_repetitions: int, seed: int) -> List[int]:
+    """
+    Derive seeds of repetitions of the cell.
+
+    Seeds depend only on the root seed and parameters of the cell, so cells
+    computed after a restart get the same seeds as in an uninterrupted sweep.
+    """
+    cell_hash = int(hashlib.sha256(get_cell_key(params).encode()).hexdigest()[:8], 16)
+    children = np.random.SeedSequence([seed, cell_hash]).spawn(n_repetitions)
+    return [int(child.generate_state(1)[0]) for child in children]
+
+
+def _init_worker(run_fn: Callable[[Dict[str, Any], Any], Dict[str, Any]], shared: Any) -> None:
+    _WORKER.update(run_fn=run_fn, shared=shared)
+
+
+def get_global_stats(results: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Reduce results of a repetition to what is sent back from a worker.
+
+    Only global stats are kept, local ones are not needed by metrics.
+    """
+    return {
+        method: logs._global_stats_converted if isinstance(logs, nd.Logger) else logs
+        for method, logs in results.items()
+    }
+
+
+def _run_repetition(params: Dict[str, Any], seed: int) -> Dict[str, Any]:
+    functions.set_seed(seed)
+    return get_global_stats(_WORKER["run_fn"](params, _WORKER["shared"]))
+
+
+def get_rows(
+    accumulators: Dict[str, functions.LogsAccumulator], metric_names: Sequence[str]
+) -> List[Dict[str, Any]]:
+    """Get records of metrics of methods in the cell, as stored in `ResultStore`."""
+    return [
+        {"method": method, **dict(zip(metric_names, map(float, accumulator.get_metrics())))}
+        for method, accumulator in accumulators.items()
+    ]
+
+
+def run_sweep(
+    grid: Dict[str, Sequence[Any]],
+    run_fn: Callable[[Dict[str, Any], Any], Dict[str, Any]],
+    store: ResultStore,
+    n_repetitions: int,
+    shared: Any = None,
+    seed: Optional[int] = None,
+    max_workers: Optional[int] = None,
+    metric_names: Sequence[str] = METRIC_NAMES,
+) -> pd.DataFrame:
+    """
+    Run pending cells of the grid and store their metrics.
+
+    A repetition is a call of `run_fn(params, shared)` which returns logs of
+    simulations keyed by names of methods, e.g. {"Temporal": logs_1, "Static":
+    logs_2}. Metrics of each method are computed as in `functions.get_metrics`
+    over all repetitions of the cell. Before each repetition global random
+    states are set with `functions.set_seed` to a seed derived from `seed` and
+    parameters of the cell.
+
+    :param grid: values of each parameter, see `expand_grid`
+    :param run_fn: a function which performs one repetition in a cell; on
+        platforms which do not fork processes it must be picklable
+    :param store: a store to skip completed cells with and to save new ones in
+    :param n_repetitions: number of repetitions of each cell
+    :param shared: an object passed to `run_fn`, e.g. networks; it is sent to
+        each worker once, when the worker starts
+    :param seed: a root seed; if not provided it is drawn from the global
+        NumPy state, so resumed sweeps should pass it explicitly
+    :param max_workers: number of processes; if 1, repetitions are performed
+        in the current process
+    :param metric_names: names of columns with metrics returned by
+        `functions.get_metrics`, e.g. ("epochs", "start_0", "start_1",
+        "final_0", "final_1")
+    :return: results of all cells of the grid in order of `expand_grid`
+    """
+    if seed is None:
+        seed = np.random.randint(0, 2 ** 32 - 1)
+    cells = expand_grid(grid)
+    completed = set(store.completed())
+    pending = [params for params in cells if get_cell_key(params) not in completed]
+    tasks = [
+        (cell_idx, params, rep_seed)
+        for cell_idx, params in enumerate(pending)
+        for rep_seed in get_cell_seeds(params, n_repetitions, seed)
+    ]
+
+    accumulators: List[Dict[str, functions.LogsAccumulator]] = [{} for _ in pending]
+    remaining = [n_repetitions] * len(pending)
+
+    def consume(cell_idx: int, results: Dict[str, Any]) -> None:
+        for method, logs in results.items():
+            accumulators[cell_idx].setdefault(method, functions.LogsAccumulator()).add(logs)
+        remaining[cell_idx] -= 1
+        if remaining[cell_idx] == 0:
+            store.add(pending[cell_idx], get_rows(accumulators[cell_idx], metric_names))
+            accumulators[cell_idx] = {}
+
+    if max_workers == 1:
+        _init_worker(run_fn, shared)
+        for cell_idx, params, rep_seed in tqdm(tasks):
+            consume(cell_idx, _run_repetition(params, rep_seed))
+    elif tasks:
+        with ProcessPoolExecutor(max_workers, initializer=_init_worker, initargs=(run_fn, shared)) as executor:
+            futures = {
+                executor.submit(_run_repetition, params, rep_seed): cell_idx for cell_idx, params, rep_seed in tasks
+            }
+            for future in tqdm(as_completed(futures), total=len(futures)):
+                consume(futures[future], future.result())
+
+    return store.to_dataframe(cells)
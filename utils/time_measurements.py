@@ -1,12 +1,63 @@
+import argparse
+import functools
+import gc
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
 import time
+import tracemalloc
 
 from dataclasses import dataclass
-from typing import Any, Callable, List, Union
+from queue import Empty
+from typing import Any, Callable, Dict, List, Optional, Sequence, Union
 
-import matplotlib.pyplot as plt
+import networkx as nx
 import network_diffusion as nd
 import numpy as np
 import pandas as pd
+import scipy
+
+from utils import berahmand_centrality, models, networks
+
+
+def __getattr__(name):
+    # `plot_time_efficiency` moved to `plotting`, it is imported on first use
+    if name == "plot_time_efficiency":
+        from utils import plotting
+        return plotting.plot_time_efficiency
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# sizes of ER networks used in `efficiency_test.ipynb` and larger ones
+NOTEBOOK_SIZES = (*range(10, 125, 5), 250, 375, 500, 750, 1000)
+LARGE_SIZES = (2500, 5000, 10000, 25000, 50000, 100000)
+
+MODEL_FACTORIES = {
+    "MLTModel": models.get_ltm,
+    "MICModel": models.get_icm,
+    "TemporalNetworkEpistemologyModel": models.get_tnem,
+    "SIR_UAModel": models.get_sirua,
+}
+
+# selectors compared in `icm_mds.ipynb` and sizes of networks to rank nodes of
+SELECTOR_FACTORIES = {
+    "degree": nd.seeding.DegreeCentralitySelector,
+    "betweenness": nd.seeding.BetweennessSelector,
+    "closeness": nd.seeding.ClosenessSelector,
+    "VoteRank": nd.seeding.VoteRankMLNSeedSelector,
+    "Berahmand": berahmand_centrality.BerahmandCentralitySelector,
+    "driver": functools.partial(nd.seeding.DriverActorSelector, nd.seeding.DegreeCentralitySelector()),
+}
+SELECTOR_SIZES = (100, 250, 500, 1000, 2500, 5000, 10000)
+
+# modules imported by worker processes, heavy dependencies whose import times
+# are reported separately and a budget of the import time of a module (ms)
+IMPORT_MODULES = ("utils.functions", "utils.models", "utils.engines", "utils.runner", "utils.sweep")
+HEAVY_MODULES = ("network_diffusion", "matplotlib.pyplot", "networkx", "pandas", "scipy.sparse")
+IMPORT_BUDGET_MS = 1500.0
 
 
 @dataclass
@@ -59,27 +110,582 @@ def time_complexity(
     return pd.DataFrame(execution_times).transpose()
 
 
-def plot_time_efficiency(
-        data: pd.DataFrame, data_name: str, axes: plt.Axes
+def get_environment() -> Dict[str, Any]:
+    """Describe the machine, versions of packages and the commit of the repo."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "network_diffusion": getattr(nd, "__version__", None),
+        "networkx": nx.__version__,
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "scipy": scipy.__version__,
+    }
+
+
+def get_er_network(size: int, p: float = 0.1, max_mean_degree: float = 100) -> nd.MultilayerNetwork:
+    """
+    Create a network as in `efficiency_test.ipynb` - two layers of the same ER graph.
+
+    For sizes above 1000 nodes the probability of an edge is lowered so that a
+    mean degree does not exceed `max_mean_degree`.
+    """
+    p = min(p, max_mean_degree / max(size - 1, 1))
+    layer = nx.fast_gnp_random_graph(size, p=p)
+    return nd.MultilayerNetwork.from_nx_layer(network_layer=layer, layer_names=["contagion", "awareness"])
+
+
+def get_scaled_er_net(size: int) -> nd.MultilayerNetwork:
+    """Create `networks.get_er_net` of the size with the same mean degrees as for 1000 nodes."""
+    return networks.get_er_net(n=size, p_contagion=min(1.0, 5 / size), p_awareness=min(1.0, 50 / size))
+
+
+SELECTOR_NETWORK_FACTORIES = {"ER": get_scaled_er_net, "SF": networks.get_sf_net}
+
+
+def _time_epochs(model: nd.models.BaseModel, epoch_times: List[int]) -> None:
+    """Record duration of each call of `network_evaluation_step` of the model."""
+    evaluation_step = model.network_evaluation_step
+
+    def timed_evaluation_step(net):
+        start = time.perf_counter_ns()
+        new_states = evaluation_step(net)
+        epoch_times.append(time.perf_counter_ns() - start)
+        return new_states
+
+    model.network_evaluation_step = timed_evaluation_step
+
+
+def measure_propagation(
+    model_factory: Callable[[], nd.models.BaseModel],
+    network: Union[nd.MultilayerNetwork, nd.TemporalNetwork],
+    num_epochs: int,
+    repetitions: int = 10,
+    warmup: int = 2,
+    track_memory: bool = True,
+    simulator: Callable = nd.Simulator,
+) -> Dict[str, Any]:
+    """
+    Measure time of the propagation of the model on the network.
+
+    Only `perform_propagation` is timed, creation of the model is not. The
+    garbage collector is disabled in timed regions, warm-up runs are not
+    recorded and the peak memory is measured in an extra run, since tracing
+    allocations slows down the code.
+
+    :param model_factory: a function that creates the model for each run
+    :param network: a network to run the model on
+    :param num_epochs: number of epochs of each run
+    :param repetitions: number of timed runs
+    :param warmup: number of runs before the timed ones
+    :param track_memory: a flag whether to measure a peak memory of a run
+    :param simulator: a class to run the model with, e.g. `nd.Simulator`
+    :return: durations of runs and median durations of epochs in nanoseconds
+        and the peak memory in bytes (None if not tracked)
+    """
+    for _ in range(warmup):
+        simulator(model_factory(), network).perform_propagation(n_epochs=num_epochs, patience=None)
+
+    times, epochs_times = [], []
+    for _ in range(repetitions):
+        model, epoch_times = model_factory(), []
+        _time_epochs(model, epoch_times)
+        experiment = simulator(model, network)
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter_ns()
+            experiment.perform_propagation(n_epochs=num_epochs, patience=None)
+            times.append(time.perf_counter_ns() - start)
+        finally:
+            gc.enable()
+        epochs_times.append(epoch_times)
+
+    peak_memory = None
+    if track_memory:
+        experiment = simulator(model_factory(), network)
+        gc.collect()
+        tracemalloc.start()
+        try:
+            experiment.perform_propagation(n_epochs=num_epochs, patience=None)
+            peak_memory = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    return {
+        "times_ns": times,
+        "epoch_times_ns": pd.DataFrame(epochs_times).median().astype(int).tolist(),
+        "peak_memory_bytes": peak_memory,
+    }
+
+
+def benchmark_models(
+    sizes: Sequence[int] = NOTEBOOK_SIZES,
+    model_factories: Optional[Dict[str, Callable[[], nd.models.BaseModel]]] = None,
+    num_epochs: int = 200,
+    repetitions: int = 10,
+    warmup: int = 2,
+    track_memory: bool = True,
+    network_factory: Callable[[int], nd.MultilayerNetwork] = get_er_network,
+) -> pd.DataFrame:
+    """
+    Benchmark models on networks of given sizes.
+
+    :param sizes: numbers of nodes of networks
+    :param model_factories: functions that create models keyed by names, by
+        default factories from `models`
+    :param num_epochs: number of epochs of each run
+    :param repetitions: number of timed runs per model and size
+    :param warmup: number of untimed runs per model and size
+    :param track_memory: a flag whether to measure a peak memory of a run
+    :param network_factory: a function that creates a network of the size
+    :return: a dataframe with a row per model and size; times are in ms
+    """
+    model_factories = model_factories or MODEL_FACTORIES
+    records = []
+    for size in sizes:
+        start = time.perf_counter_ns()
+        network = network_factory(size)
+        setup_time = time.perf_counter_ns() - start
+        for model_name, model_factory in model_factories.items():
+            measurements = measure_propagation(
+                model_factory, network, num_epochs, repetitions, warmup, track_memory
+            )
+            times = np.array(measurements["times_ns"]) / 1e6
+            q1, median, q3 = np.percentile(times, [25, 50, 75])
+            records.append({
+                "model": model_name,
+                "size": size,
+                "edges": sum(l_graph.number_of_edges() for l_graph in network.layers.values()),
+                "setup_ms": setup_time / 1e6,
+                "median_ms": median,
+                "iqr_ms": q3 - q1,
+                "min_ms": times.min(),
+                "epoch_median_ms": np.median(measurements["epoch_times_ns"]) / 1e6,
+                "peak_memory_mb": (
+                    measurements["peak_memory_bytes"] / 2 ** 20
+                    if measurements["peak_memory_bytes"] is not None else None
+                ),
+                "times_ms": times.tolist(),
+                "epoch_times_ms": (np.array(measurements["epoch_times_ns"]) / 1e6).tolist(),
+            })
+    return pd.DataFrame(records)
+
+
+def measure_call(
+    function: Callable[[], Any],
+    repetitions: int = 5,
+    warmup: int = 1,
+    track_memory: bool = True,
+    time_budget_ns: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Measure time and peak memory of calling the function.
+
+    The garbage collector is disabled in timed calls and the peak memory is
+    measured in an extra call.
+
+    :param function: a function to call without arguments
+    :param repetitions: number of timed calls
+    :param warmup: number of calls before the timed ones
+    :param track_memory: a flag whether to measure a peak memory of a call
+    :param time_budget_ns: if a call lasts longer, no more calls are made
+    :return: durations of calls in nanoseconds and the peak memory in bytes
+        (None if not tracked)
+    """
+    for _ in range(warmup):
+        start = time.perf_counter_ns()
+        function()
+        if time_budget_ns is not None and time.perf_counter_ns() - start > time_budget_ns:
+            break
+
+    times = []
+    for _ in range(repetitions):
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter_ns()
+            function()
+            times.append(time.perf_counter_ns() - start)
+        finally:
+            gc.enable()
+        if time_budget_ns is not None and times[-1] > time_budget_ns:
+            track_memory = False
+            break
+
+    peak_memory = None
+    if track_memory:
+        gc.collect()
+        tracemalloc.start()
+        try:
+            function()
+            peak_memory = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return {"times_ns": times, "peak_memory_bytes": peak_memory}
+
+
+def _rank_actors(
+    queue: multiprocessing.Queue,
+    selector_factory: Callable[[], nd.seeding.base_selector.BaseSeedSelector],
+    network: nd.MultilayerNetwork,
+    repetitions: int,
+    warmup: int,
+    track_memory: bool,
+    time_budget_ns: int,
 ) -> None:
+    try:
+        selector = selector_factory()
+        queue.put(measure_call(
+            functools.partial(selector.actorwise, network), repetitions, warmup, track_memory, time_budget_ns
+        ))
+    except Exception as error:
+        queue.put({"times_ns": [], "peak_memory_bytes": None, "error": repr(error)})
+
+
+def _measure_selector(
+    selector_factory: Callable[[], nd.seeding.base_selector.BaseSeedSelector],
+    network: nd.MultilayerNetwork,
+    repetitions: int,
+    warmup: int,
+    track_memory: bool,
+    time_budget_s: float,
+) -> Dict[str, Any]:
     """
-    Produce plot for measurement.
+    Measure ranking of actors in a child process.
 
-    The resulting plot is a curve of mean time for each sample bounded by its
-    standard deviation.
+    Since a single call of a slow selector (e.g. `DriverActorSelector`) can
+    last for hours, the process is killed if it does not finish before the
+    time budget of all calls passes. An exception raised by the selector (or
+    a crash of the process) is reported in the "error" field.
+    """
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(
+        target=_rank_actors,
+        args=(queue, selector_factory, network, repetitions, warmup, track_memory, int(time_budget_s * 1e9)),
+    )
+    process.start()
+    deadline = time.perf_counter() + time_budget_s * (repetitions + warmup + track_memory) + 10
+    measurements = None
+    try:
+        while measurements is None and time.perf_counter() < deadline:
+            try:
+                measurements = queue.get(timeout=min(1.0, max(deadline - time.perf_counter(), 0.01)))
+            except Empty:
+                if not process.is_alive() and queue.empty():
+                    measurements = {"times_ns": [], "peak_memory_bytes": None, "error": "process crashed"}
+    finally:
+        process.kill()
+        process.join()
+    if measurements is None:
+        return {"times_ns": [], "peak_memory_bytes": None, "timed_out": True, "error": None}
+    return {"error": None, **measurements, "timed_out": False}
 
-    :param data: a dataframe with measurements (opuput of "time_complexity")
-    :param data_name: name of the data
-    :param axes: canvas to plot curves on
+
+def benchmark_selectors(
+    sizes: Sequence[int] = SELECTOR_SIZES,
+    selector_factories: Optional[Dict[str, Callable[[], nd.seeding.base_selector.BaseSeedSelector]]] = None,
+    network_factories: Optional[Dict[str, Callable[[int], nd.MultilayerNetwork]]] = None,
+    repetitions: int = 5,
+    warmup: int = 1,
+    track_memory: bool = True,
+    time_budget_s: float = 60.0,
+) -> pd.DataFrame:
+    """
+    Benchmark computing actorwise rankings of seed selectors on growing networks.
+
+    Only the ranking is timed, without any propagation, each selector and
+    network in a separate process. Once the median time of a selector on a
+    network type exceeds the budget (or the measurement times out or fails),
+    larger networks of that type are skipped for the selector.
+
+    :param sizes: numbers of nodes of networks, in ascending order
+    :param selector_factories: functions that create selectors keyed by names,
+        by default selectors from `icm_mds.ipynb`
+    :param network_factories: functions that create networks of the size
+        keyed by names, by default scaled ER and SF networks from `networks`
+    :param repetitions: number of timed calls per selector and network
+    :param warmup: number of untimed calls per selector and network
+    :param track_memory: a flag whether to measure a peak memory of a call
+    :param time_budget_s: a median time of the ranking above which the
+        selector is considered not viable
+    :return: a dataframe with a row per network type, size and selector;
+        times are in ms, failed measurements have NaN times and a reason in
+        the "error" column
+    """
+    selector_factories = selector_factories or SELECTOR_FACTORIES
+    network_factories = network_factories or SELECTOR_NETWORK_FACTORIES
+    records = []
+    for network_name, network_factory in network_factories.items():
+        viable = set(selector_factories.keys())
+        for size in sizes:
+            if not viable:
+                break
+            network = network_factory(size)
+            for selector_name in [name for name in selector_factories if name in viable]:
+                measurements = _measure_selector(
+                    selector_factories[selector_name], network, repetitions, warmup, track_memory, time_budget_s
+                )
+                times = np.array(measurements["times_ns"]) / 1e6
+                q1, median, q3 = np.percentile(times, [25, 50, 75]) if len(times) else (np.nan,) * 3
+                if not median <= time_budget_s * 1e3:
+                    viable.remove(selector_name)
+                records.append({
+                    "selector": selector_name,
+                    "network": network_name,
+                    "size": size,
+                    "actors": network.get_actors_num(),
+                    "edges": sum(l_graph.number_of_edges() for l_graph in network.layers.values()),
+                    "median_ms": median,
+                    "iqr_ms": q3 - q1,
+                    "min_ms": times.min() if len(times) else np.nan,
+                    "peak_memory_mb": (
+                        measurements["peak_memory_bytes"] / 2 ** 20
+                        if measurements["peak_memory_bytes"] is not None else None
+                    ),
+                    "timed_out": measurements["timed_out"],
+                    "error": measurements["error"],
+                    "times_ms": times.tolist(),
+                })
+    return pd.DataFrame(records)
+
+
+def _parse_importtime(output: str) -> Dict[str, int]:
+    """Get cumulative import times (us) of modules from the output of `python -X importtime`."""
+    times = {}
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit():
+            times.setdefault(name.strip(), int(cumulative))
+    return times
+
+
+def measure_import(module: str, repetitions: int = 5, warmup: int = 1) -> Dict[str, Any]:
+    """
+    Measure importing the module in fresh interpreters, as a spawned worker does.
+
+    :param module: a name of the module, e.g. "utils.runner"
+    :param repetitions: number of timed imports
+    :param warmup: number of imports before the timed ones (to compile sources)
+    :return: cumulative import times of the module and of the heavy modules
+        it pulls in (according to `-X importtime`) and wall times of whole
+        processes, all in ms
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [root, os.environ.get("PYTHONPATH")]))}
+    command = [sys.executable, "-X", "importtime", "-c", f"import {module}"]
+    for _ in range(warmup):
+        subprocess.run(command, cwd=root, env=env, capture_output=True, check=True)
+
+    times, process_times, heavy_times = [], [], {name: [] for name in HEAVY_MODULES}
+    for _ in range(repetitions):
+        start = time.perf_counter_ns()
+        completed = subprocess.run(command, cwd=root, env=env, capture_output=True, text=True, check=True)
+        process_times.append((time.perf_counter_ns() - start) / 1e6)
+        module_times = _parse_importtime(completed.stderr)
+        times.append(module_times[module] / 1e3)
+        for name in HEAVY_MODULES:
+            heavy_times[name].append(module_times[name] / 1e3 if name in module_times else 0.0)
+    return {"times_ms": times, "process_times_ms": process_times, "heavy_times_ms": heavy_times}
+
+
+def benchmark_imports(
+    modules: Sequence[str] = IMPORT_MODULES,
+    repetitions: int = 5,
+    warmup: int = 1,
+    budget_ms: float = IMPORT_BUDGET_MS,
+) -> pd.DataFrame:
     """
+    Benchmark start-up costs of modules imported by worker processes.
+
+    :param modules: names of modules
+    :param repetitions: number of timed imports of each module
+    :param warmup: number of untimed imports of each module
+    :param budget_ms: a median import time above which the module is flagged
+    :return: a dataframe with a row per module; times are in ms, columns named
+        after heavy modules hold their median import times (0 if not imported),
+        counted where they are imported first, so they overlap (e.g.
+        `network_diffusion` imports `matplotlib.pyplot` on its own)
+    """
+    records = []
+    for module in modules:
+        measurements = measure_import(module, repetitions, warmup)
+        times = np.array(measurements["times_ms"])
+        q1, median, q3 = np.percentile(times, [25, 50, 75])
+        records.append({
+            "module": module,
+            "median_ms": median,
+            "iqr_ms": q3 - q1,
+            "process_median_ms": np.median(measurements["process_times_ms"]),
+            **{f"{name}_ms": np.median(values) for name, values in measurements["heavy_times_ms"].items()},
+            "over_budget": median > budget_ms,
+            "times_ms": times.tolist(),
+        })
+    return pd.DataFrame(records)
 
-    x = data.index.to_numpy()
-    y = data.apply(lambda row: np.mean(row), axis=1).to_numpy()
-    y_std = data.apply(lambda row: np.std(row), axis=1).to_numpy()
 
-    axes.plot(
-        x, y, '-o',
-        label=f"'{data_name}'",
-        alpha=0.9
+def get_viable_sizes(results: pd.DataFrame, time_budget_s: float = 60.0) -> pd.DataFrame:
+    """
+    Find the largest network each selector ranks within the time budget.
+
+    :param results: output of `benchmark_selectors`
+    :param time_budget_s: a tolerated median time of the ranking
+    :return: a dataframe with the largest viable and the smallest not viable
+        size (NaN if not reached) for each network type and selector; failed
+        measurements are not counted as not viable, the size they occurred
+        at and their reason are in "failed_at" and "error" columns instead
+    """
+    results = results.assign(
+        viable=results["median_ms"] <= time_budget_s * 1e3, failed=results["error"].notna()
+    )
+    return results.groupby(["network", "selector"]).apply(
+        lambda group: pd.Series({
+            "viable_up_to": group.loc[group["viable"], "size"].max(),
+            "not_viable_from": group.loc[~group["viable"] & ~group["failed"], "size"].min(),
+            "failed_at": group.loc[group["failed"], "size"].min(),
+            "error": group.loc[group["failed"], "error"].iloc[0] if group["failed"].any() else None,
+        })
     )
-    axes.fill_between(x, y-y_std, y+y_std, alpha=0.2)
+
+
+def to_time_complexity_frame(results: pd.DataFrame, name: str, key: str = "model") -> pd.DataFrame:
+    """
+    Convert results of the model (or the selector) to the layout of `time_complexity` output.
+
+    :param results: output of `benchmark_models` or `benchmark_selectors` (in
+        the latter case filtered to one network type)
+    :param name: name of the model or the selector
+    :param key: a column with names, i.e. "model" or "selector"
+    """
+    results = results[results[key] == name]
+    return pd.DataFrame(
+        [times for times in results["times_ms"]],
+        index=results["size"].to_numpy(),
+        columns=[f"run_{i}" for i in range(len(results["times_ms"].iloc[0]))],
+    )
+
+
+def save_results(results: pd.DataFrame, path: str, environment: Optional[Dict[str, Any]] = None) -> None:
+    """
+    Save results of the benchmark with metadata of the environment.
+
+    :param results: output of `benchmark_models`
+    :param path: a `.json` file or a `.csv` file, in which the metadata is
+        stored in leading lines starting with "#"
+    :param environment: metadata, by default obtained with `get_environment`
+    """
+    environment = environment or get_environment()
+    if path.endswith(".csv"):
+        with open(path, "w", encoding="utf-8") as file:
+            for key, value in environment.items():
+                file.write(f"# {key}: {value}\n")
+            results.drop(columns=["times_ms", "epoch_times_ms"], errors="ignore").to_csv(file, index=False)
+    else:
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump({"environment": environment, "results": results.to_dict(orient="records")}, file, indent=1)
+
+
+def load_results(path: str) -> pd.DataFrame:
+    """Load results saved with `save_results`."""
+    if path.endswith(".csv"):
+        return pd.read_csv(path, comment="#")
+    with open(path, encoding="utf-8") as file:
+        return pd.DataFrame(json.load(file)["results"])
+
+
+def compare_with_baseline(results: pd.DataFrame, baseline: pd.DataFrame, threshold: float = 0.1) -> pd.DataFrame:
+    """
+    Compare results with the baseline ones.
+
+    A case is flagged as a regression if its median time is greater than the
+    baseline one by more than `threshold` (relatively) and by more than the
+    interquartile range of the baseline (to ignore noise).
+
+    :param results: output of `benchmark_models`
+    :param baseline: results obtained e.g. for a previous commit
+    :param threshold: a tolerated relative slowdown
+    :return: a dataframe with medians, their ratio and a regression flag for
+        each model and size measured in both results
+    """
+    compared = results[["model", "size", "median_ms", "iqr_ms"]].merge(
+        baseline[["model", "size", "median_ms", "iqr_ms"]], on=["model", "size"], suffixes=("", "_baseline")
+    )
+    compared["ratio"] = compared["median_ms"] / compared["median_ms_baseline"]
+    compared["regression"] = (compared["ratio"] > 1 + threshold) & (
+        compared["median_ms"] - compared["median_ms_baseline"] > compared["iqr_ms_baseline"]
+    )
+    return compared
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark propagation models or seed selectors.")
+    parser.add_argument("--mode", choices=["models", "selectors", "imports"], default="models")
+    parser.add_argument("--sizes", choices=["notebook", "large", "all"], default="notebook",
+                        help="sizes of networks in the models mode")
+    parser.add_argument("--models", nargs="+", choices=[*MODEL_FACTORIES.keys()], default=[*MODEL_FACTORIES.keys()])
+    parser.add_argument("--selectors", nargs="+", choices=[*SELECTOR_FACTORIES.keys()],
+                        default=[*SELECTOR_FACTORIES.keys()])
+    parser.add_argument("--selector-sizes", nargs="+", type=int, default=SELECTOR_SIZES)
+    parser.add_argument("--time-budget", type=float, default=60.0,
+                        help="time of ranking (s) above which a selector is not viable")
+    parser.add_argument("--modules", nargs="+", default=IMPORT_MODULES, help="modules in the imports mode")
+    parser.add_argument("--import-budget", type=float, default=IMPORT_BUDGET_MS,
+                        help="import time (ms) above which a module sets exit code to 1")
+    parser.add_argument("--epochs", type=int, default=200)
+    parser.add_argument("--repetitions", type=int, default=10)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--no-memory", action="store_true", help="do not measure peak memory")
+    parser.add_argument("--output", default="efficiency_test/benchmark.json", help="a .json or .csv file")
+    parser.add_argument("--baseline", help="results to compare with, a regression sets exit code to 1")
+    parser.add_argument("--threshold", type=float, default=0.1)
+    args = parser.parse_args()
+
+    if args.mode == "selectors":
+        benchmark_results = benchmark_selectors(
+            sizes=args.selector_sizes,
+            selector_factories={name: SELECTOR_FACTORIES[name] for name in args.selectors},
+            repetitions=args.repetitions,
+            warmup=args.warmup,
+            track_memory=not args.no_memory,
+            time_budget_s=args.time_budget,
+        )
+        save_results(benchmark_results, args.output)
+        print(benchmark_results.drop(columns=["times_ms"]).to_string(index=False))
+        print(get_viable_sizes(benchmark_results, args.time_budget).to_string())
+        sys.exit(0)
+
+    if args.mode == "imports":
+        benchmark_results = benchmark_imports(args.modules, args.repetitions, args.warmup, args.import_budget)
+        save_results(benchmark_results, args.output)
+        print(benchmark_results.drop(columns=["times_ms"]).to_string(index=False))
+        sys.exit(int(benchmark_results["over_budget"].any()))
+
+    sizes = {"notebook": NOTEBOOK_SIZES, "large": LARGE_SIZES, "all": (*NOTEBOOK_SIZES, *LARGE_SIZES)}[args.sizes]
+    benchmark_results = benchmark_models(
+        sizes=sizes,
+        model_factories={name: MODEL_FACTORIES[name] for name in args.models},
+        num_epochs=args.epochs,
+        repetitions=args.repetitions,
+        warmup=args.warmup,
+        track_memory=not args.no_memory,
+    )
+    save_results(benchmark_results, args.output)
+    print(benchmark_results.drop(columns=["times_ms", "epoch_times_ms"]).to_string(index=False))
+
+    if args.baseline:
+        comparison = compare_with_baseline(benchmark_results, load_results(args.baseline), args.threshold)
+        print(comparison.to_string(index=False))
+        if comparison["regression"].any():
+            sys.exit(1)